@@ -42,22 +42,25 @@ __version__ = "0.0.2"
 
 # Standard library
 import argparse
-import csv
 import pathlib
 import sys
 from datetime import datetime
 
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 try:
-    import requests
+    from kandjilib import cli, client, pagination, report
+    from kandjilib.flatten import flatten
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -94,6 +97,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Current working directory
 HERE = pathlib.Path("__file__").parent.absolute()
 
@@ -153,6 +159,8 @@ def program_arguments():
         required=False,
     )
 
+    cli.add_report_arguments(parser)
+
     parser.version = __version__
     parser.add_argument("--version", action="version", help="Show this tool's version.")
 
@@ -164,54 +172,6 @@ def program_arguments():
     return parser.parse_args()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device, it could be because the device is "
-            "no longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
-
-
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -222,35 +182,7 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
 
 def download_public_key():
@@ -260,69 +192,17 @@ def download_public_key():
 
 def list_devices_associated_to_ade_token(ade_token, params=None):
     """Return list of ADE integrations."""
-    page_number = 1
-    data = []
-
-    while True:
-        params = {"page": f"{page_number}"}
-        response = kandji_api(
-            method="GET",
-            endpoint=f"/v1/integrations/apple/ade/{ade_token}/devices",
-            params=params,
-        )
-
-        # breakout the response then append to the data list
-        for record in response["results"]:
-            data.append(record)
-
-        if response["next"] is None:
-            if len(data) < 1:
-                print("No devices found...\n")
-            break
+    # Pages after the first are requested several at a time
+    data = pagination.get_results(
+        CLIENT, f"/v1/integrations/apple/ade/{ade_token}/devices", params=params
+    )
 
-        page_number += 1
+    if len(data) < 1:
+        print("No devices found...\n")
 
     return data
 
 
-def flatten(input_dict, separator=".", prefix=""):
-    """Flatten JSON."""
-    output_dict = {}
-
-    for key, value in input_dict.items():
-        # Check to see if the JSON value is a dict type. If it is then we we need to break the
-        # JSON structure out more.
-        if isinstance(value, dict) and value:
-            deeper = flatten(value, separator, prefix + key + separator)
-
-            # update the dictionary with the new structure.
-            output_dict.update({key2: val2 for key2, val2 in deeper.items()})
-
-        # If the JSON value is a list then loop over and see if we need to break out any values
-        # contained in the list.
-        elif isinstance(value, list) and value:
-            for index, sublist in enumerate(value, start=1):
-                # Check to see if the JSON value is a dict type. If it is then we we need to
-                # break the JSON structure out more.
-                if isinstance(sublist, dict) and sublist:
-                    deeper = flatten(
-                        sublist,
-                        separator,
-                        prefix + key + separator + str(index) + separator,
-                    )
-
-                    # update the dictionary with the new structure.
-                    output_dict.update({key2: val2 for key2, val2 in deeper.items()})
-
-                else:
-                    output_dict[prefix + key + separator + str(index)] = value
-
-        else:
-            output_dict[prefix + key] = value
-
-    return output_dict
-
-
 def generate_report_payload(_input):
     """Create a JSON payload."""
     report_payload = []
@@ -335,26 +215,10 @@ def generate_report_payload(_input):
 def write_report(_input, report_name):
     """Write report."""
     # write report to csv file
-    with open(report_name, mode="w", encoding="utf-8") as report:
-        out_fields = []
-
-        # automatically loop over keys in the payload to pullout header fields
-        for item in _input:
-            for key in item.keys():
-                if key not in out_fields:
-                    out_fields.append(key)
+    report.write_report(_input, report_name)
 
-        writer = csv.DictWriter(report, fieldnames=out_fields)
 
-        # Write headers to CSV
-        writer.writeheader()
-
-        # Loop over the list sorted by serial_number
-        for item in _input:
-            writer.writerow(item)
-
-
-def report_builder(_input, name_items, default_name):
+def report_builder(_input, name_items, default_name, report_format=None):
     """Build report."""
     report_payload = generate_report_payload(_input=_input)
 
@@ -365,6 +229,9 @@ def report_builder(_input, name_items, default_name):
     else:
         report_name = f"{default_name}_{TODAY}.csv"
 
+    # Use the file extension of the report format given with --format
+    report_name = report.report_path(report_name, report_format)
+
     print("Generating report ...")
     write_report(_input=report_payload, report_name=report_name)
 
@@ -447,6 +314,7 @@ def main():
             _input=report_data,
             name_items=report_name_items,
             default_name="apple_integrations_report",
+            report_format=arguments.report_format,
         )
 
 
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""flatten_benchmark.py
+Measure how many synthetic /details records per second kandjilib.flatten flattens.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Builds synthetic device details records shaped like the responses from
+# /v1/devices/{device_id}/details and flattens them with the shared flattener and with
+# the recursive flatten the report tools used before it. The two must return the same
+# rows. Run it from the api-tools folder:
+#
+#   python3 benchmarks/flatten_benchmark.py --records 10000
+
+__version__ = "1.0.0"
+
+
+# Standard library
+import argparse
+import pathlib
+import sys
+import time
+
+# Add the api-tools folder to the path so the shared kandjilib package can be imported
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+# Local libs
+from kandjilib.flatten import Flattener  # noqa: E402
+
+
+def program_arguments():
+    """Return arguments."""
+    parser = argparse.ArgumentParser(
+        prog="flatten_benchmark",
+        description="Measure the throughput of kandjilib.flatten on synthetic device "
+        "details records.",
+        allow_abbrev=False,
+    )
+
+    parser.add_argument(
+        "--records",
+        type=int,
+        default=10_000,
+        metavar="10000",
+        help="Number of synthetic /details records to flatten.",
+    )
+
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        metavar="5",
+        help="Number of timed runs. The fastest run is reported.",
+    )
+
+    parser.add_argument("--version", action="version", version=__version__)
+
+    return parser.parse_args()
+
+
+def details_record(index):
+    """Return a synthetic /details record."""
+    return {
+        "general": {
+            "device_id": f"{index:08x}-0000-4000-8000-000000000000",
+            "device_name": f"Mac-{index:05d}",
+            "last_enrollment": "2026-01-01T00:00:00.000000Z",
+            "first_enrollment": "2025-01-01T00:00:00.000000Z",
+            "model": "MacBook Pro (14-inch, 2023)",
+            "platform": "Mac",
+            "os_version": "14.2.1",
+            "system_version": "14.2.1 (23C71)",
+            "boot_volume": "Macintosh HD",
+            "time_since_boot": "3 days",
+            "last_user": f"user{index}",
+            "asset_tag": "",
+            "assigned_user": f"user{index}@example.com",
+            "blueprint_name": f"Blueprint {index % 8}",
+            "blueprint_uuid": f"bp-{index % 8}",
+        },
+        "mdm": {
+            "mdm_enabled": "True",
+            "supervised": "True",
+            "install_date": "2026-01-01 00:00:00 +0000",
+            "last_check_in": "2026-10-01T00:00:00.000000Z",
+            "mdm_enabled_user": [f"user{index}"],
+        },
+        "activation_lock": {
+            "bypass_code_failed": False,
+            "user_activation_lock_enabled": False,
+            "device_activation_lock_enabled": index % 3 == 1,
+            "activation_lock_allowed_while_supervised": False,
+            "activation_lock_supported": True,
+        },
+        "filevault": {
+            "filevault_enabled": True,
+            "filevault_recoverykey_type": "Personal",
+            "filevault_prk_escrowed": bool(index % 2),
+            "filevault_next_rotation": "2026-12-01",
+            "filevault_regen_required": False,
+        },
+        "automated_device_enrollment": (
+            {}
+            if index % 3 == 0
+            else {"auto_enroll_eligible": True, "auto_enrolled": bool(index % 2)}
+        ),
+        "kandji_agent": {
+            "agent_installed": "True",
+            "install_date": "2026-01-01T00:00:00Z",
+            "last_check_in": "2026-10-01T00:00:00Z",
+            "agent_version": "4.1.2",
+        },
+        "hardware_overview": {
+            "model_name": "MacBook Pro",
+            "model_identifier": "Mac14,9",
+            "processor_name": "Apple M2 Pro",
+            "processor_speed": "",
+            "number_of_processors": "1",
+            "total_number_of_cores": "10",
+            "memory": "16 GB",
+            "udid": f"udid-{index}",
+            "serial_number": f"C02{index:07d}",
+        },
+        "volumes": [
+            {
+                "name": f"Volume {volume}",
+                "format": "APFS",
+                "percent_used": "60%",
+                "identifier": f"disk3s{volume}",
+                "capacity": "494.38 GB",
+                "available": "200.12 GB",
+                "encrypted": "Yes",
+            }
+            for volume in range(4)
+        ],
+        "network": {
+            "local_hostname": f"Mac-{index:05d}",
+            "mac_address": "aa:bb:cc:dd:ee:ff",
+            "ip_address": "10.0.0.1",
+            "public_ip": "203.0.113.1",
+        },
+        "recovery_information": {
+            "recovery_lock_enabled": index % 7 == 0,
+            "firmware_password_exist": False,
+            "firmware_password_pending": False,
+            "password_rotation_scheduled": None,
+        },
+        "users": {
+            "regular_users": [
+                {
+                    "username": f"user{index}",
+                    "uid": "501",
+                    "path": f"/Users/user{index}",
+                    "name": f"User {index}",
+                    "admin": "Yes",
+                }
+            ],
+            "system_users": [
+                {
+                    "username": f"_system{user}",
+                    "uid": f"{200 + user}",
+                    "path": "/var/empty",
+                    "name": f"System {user}",
+                    "admin": "No",
+                }
+                for user in range(20)
+            ],
+        },
+        "installed_profiles": [
+            {
+                "name": f"Profile {profile}",
+                "uuid": f"profile-{profile}",
+                "verified": "verified",
+                "organization": "Kandji",
+                "install_date": "2026-01-01 00:00:00 +0000",
+                "payload_types": ["com.apple.security.firewall"],
+            }
+            for profile in range(10)
+        ],
+        "apple_business_manager": {},
+        "security_information": {
+            "remote_desktop_enabled": index % 5 == 0,
+            "sip_enabled": True,
+            "gatekeeper_enabled": True,
+        },
+        "lost_mode": None,
+    }
+
+
+def recursive_flatten(input_dict, separator=".", prefix=""):
+    """The recursive flatten the report tools used before kandjilib.flatten."""
+    output_dict = {}
+
+    for key, value in input_dict.items():
+        if isinstance(value, dict) and value:
+            deeper = recursive_flatten(value, separator, prefix + key + separator)
+            output_dict.update({key2: val2 for key2, val2 in deeper.items()})
+
+        elif isinstance(value, list) and value:
+            for index, sublist in enumerate(value, start=1):
+                if isinstance(sublist, dict) and sublist:
+                    deeper = recursive_flatten(
+                        sublist,
+                        separator,
+                        prefix + key + separator + str(index) + separator,
+                    )
+                    output_dict.update({key2: val2 for key2, val2 in deeper.items()})
+
+                else:
+                    output_dict[prefix + key + separator + str(index)] = value
+
+        else:
+            output_dict[prefix + key] = value
+
+    return output_dict
+
+
+def best_time(function, records, repeat):
+    """Return the fastest of repeat runs of function over every record in seconds."""
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+
+        for record in records:
+            function(record)
+
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main():
+    """Run main logic."""
+    arguments = program_arguments()
+
+    print(f"Building {arguments.records:,} synthetic /details records...")
+    records = [details_record(index) for index in range(arguments.records)]
+
+    flattener = Flattener()
+
+    for record in records[:100]:
+        if list(flattener(record).items()) != list(recursive_flatten(record).items()):
+            sys.exit("kandjilib.flatten and the recursive flatten do not match...")
+
+    columns = len(flattener(records[0]))
+    print(f"Each record flattens to about {columns} columns\n")
+
+    results = {
+        "recursive flatten": best_time(recursive_flatten, records, arguments.repeat),
+        "kandjilib.flatten": best_time(flattener, records, arguments.repeat),
+    }
+
+    for name, seconds in results.items():
+        print(
+            f"{name:<20} {seconds:8.3f}s {arguments.records / seconds:>12,.0f} "
+            "records/s"
+        )
+
+    speedup = results["recursive flatten"] / results["kandjilib.flatten"]
+    print(
+        f"\nkandjilib.flatten is {speedup:.2f}x the throughput of the recursive flatten"
+    )
+
+
+if __name__ == "__main__":
+    main()
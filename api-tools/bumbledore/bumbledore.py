@@ -15,10 +15,23 @@ __version__ = "0.0.1"
 
 # Standard library
 import argparse
+import collections
+import pathlib
 import sys
 
 # Local libs
-from kandjilib import kandjiapi, tomlinit
+# kandjilib lives at the root of the api-tools folder and is shared with the other
+# api-tools scripts.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+try:
+    from kandjilib import cli, kandjiapi, report, tomlinit
+except ImportError as import_error:
+    print(import_error)
+    sys.exit(
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the "
+        "api-tools folder, one folder above this script."
+    )
 
 # Initialize some variables
 # Pulls from
@@ -49,6 +62,16 @@ def prog_args():
         required=False,
     )
 
+    parser.add_argument(
+        "--os-prefix",
+        action="store_true",
+        help=(
+            "Treat --device-os as a version prefix. For example, 14 returns devices on "
+            "14.1 and 14.2.1."
+        ),
+        required=False,
+    )
+
     parser.add_argument(
         "--device-details",
         action="store_true",
@@ -66,6 +89,14 @@ def prog_args():
         required=False,
     )
 
+    parser.add_argument(
+        "--top",
+        type=int,
+        metavar="N",
+        help="Only print the N apps with the most installs when used with --device-apps.",
+        required=False,
+    )
+
     parser.add_argument(
         "--device-status",
         action="store_true",
@@ -80,44 +111,109 @@ def prog_args():
         "--report",
         type=str,
         metavar='"report_name.csv"',
-        help="(comming soon) Enter a path where the report can be created. If a path is not specified"
-        " the report will be generated in the current directory.",
+        help=(
+            "Create a report that joins device details, installed apps, and status "
+            "for every Mac in one pass. Enter the path of the report. The report is "
+            "written as a CSV unless the path ends in .parquet or --format is given."
+        ),
         required=False,
     )
 
+    cli.add_performance_arguments(parser)
+    cli.add_report_arguments(parser)
+
     parser.add_argument("--version", action="version", help="Show this tools version.")
     parser.add_argument("-v", "--verbose", action="store", metavar="LEVEL")
 
     return parser.parse_args()
 
 
-def app_names_versions(device_ids):
-    """Return the app name and app version information from device app info"""
-
-    # List of all apps
-    data = []
+def app_names_versions(device_ids, arguments):
+    """Return the number of installs of each app name and app version
 
-    # Loop over all Mac computers in Kandji
-    for device_id in device_ids:
-        device_apps = kandjiapi.get_device_apps(BASE_URL, HEADERS, device_id)
+    Installs are counted in a Counter keyed by (app_name, version) as each device's
+    apps arrive, so only one entry per distinct app and version is kept in memory.
+    """
 
-        # Loop over each app in the Kandji "apps" list and append to data dict
-        for app in device_apps["apps"]:
+    # Number of installs per (app name, app version)
+    data = collections.Counter()
 
-            # Create a dictionary containing the application name and version
-            app_dict = {"app_name": app["app_name"], "version": app["version"]}
+    # Loop over all Mac computers in Kandji, several at a time
+    for device_apps in kandjiapi.get_each_device_apps(
+        BASE_URL,
+        HEADERS,
+        device_ids,
+        workers=arguments.workers,
+        use_async=arguments.use_async,
+    ):
 
-            # Append to data dict
-            data.append(app_dict)
+        # Count each app in the Kandji "apps" list
+        data.update((app["app_name"], app["version"]) for app in device_apps["apps"])
 
     return data
 
 
+def report_row(device_report):
+    """Return a single report row from a device's details, apps, and status"""
+
+    device = device_report["device"]
+    details = device_report["details"] or {}
+    apps = (device_report["apps"] or {}).get("apps", [])
+    status = device_report["status"] or {}
+    user = device.get("user")
+
+    library_items = status.get("library_items", [])
+    parameters = status.get("parameters", [])
+
+    return {
+        "computer_name": device.get("device_name"),
+        "guid": device.get("device_id"),
+        "serial_number": device.get("serial_number"),
+        "blueprint": device.get("blueprint_name"),
+        "username": user.get("email") if isinstance(user, dict) else user,
+        "model": device.get("model"),
+        "os_version": device.get("os_version"),
+        "last_check_in": device.get("last_check_in"),
+        "last_enrollment": details.get("general", {}).get("last_enrollment"),
+        "installed_apps": len(apps),
+        "library_items": len(library_items),
+        "library_item_status": summarize_status(library_items),
+        "parameters": len(parameters),
+        "parameter_status": summarize_status(parameters),
+    }
+
+
+def summarize_status(items):
+    """Return the number of items in each status, for example PASS: 4, FAIL: 1"""
+
+    counts = collections.Counter(item.get("status") for item in items)
+
+    return ", ".join(f"{status}: {count}" for status, count in counts.most_common())
+
+
+def write_report(devices, report_name, arguments):
+    """Write one row per device to a report and return the number of rows"""
+
+    # Details, apps, and status for each device are requested together
+    device_reports = kandjiapi.get_each_device_report(
+        BASE_URL,
+        HEADERS,
+        devices,
+        workers=arguments.workers,
+        use_async=arguments.use_async,
+    )
+
+    return report.write_report(
+        (report_row(device_report) for device_report in device_reports), report_name
+    )
+
+
 def main():
     """Run main logic"""
 
     # Return the arguments
     arguments = prog_args()
+    cli.apply_performance_arguments(kandjiapi.get_client(BASE_URL, HEADERS), arguments)
 
     # MDM vendor we are using
     print("")
@@ -125,31 +221,45 @@ def main():
     print(f"Base URL: {BASE_URL}")
     print("")
 
-    # Get all device inventory records
-    kandji_device_inventory = kandjiapi.get_all_devices(BASE_URL, HEADERS)
-
-    # List of device guids using list comprehension
-    kandji_device_ids = [device["device_id"] for device in kandji_device_inventory]
-
     if arguments.device_os:
-        # Print device detailed information based on provided OS version
-        for device_id in kandji_device_ids:
-            print(
-                kandjiapi.get_all_devices_os_version(
-                    BASE_URL, HEADERS, arguments.device_os
-                )
-            )
+        # Print the devices running the provided OS version. Kandji filters the
+        # inventory so only matching devices are downloaded.
+        for device in kandjiapi.get_all_devices_os_version(
+            BASE_URL, HEADERS, arguments.device_os, prefix=arguments.os_prefix
+        ):
+            print(device)
+
+    # Device inventory records and guids. The inventory is only read for options that
+    # need it.
+    kandji_device_inventory = []
+    kandji_device_ids = []
+
+    if (
+        arguments.device_details
+        or arguments.device_apps
+        or arguments.device_status
+        or arguments.report
+    ):
+        # Get all device inventory records. Every page of the inventory is read.
+        kandji_device_inventory = list(kandjiapi.get_all_devices(BASE_URL, HEADERS))
+        kandji_device_ids = [device["device_id"] for device in kandji_device_inventory]
 
     if arguments.device_details:
         # Print device detailed information
-        for device_id in kandji_device_ids:
-            print(kandjiapi.get_device_details(BASE_URL, HEADERS, device_id))
+        for device_details in kandjiapi.get_each_device_details(
+            BASE_URL,
+            HEADERS,
+            kandji_device_ids,
+            workers=arguments.workers,
+            use_async=arguments.use_async,
+        ):
+            print(device_details)
 
     if arguments.device_apps:
         # Print a list of installed apps, their versions, and number of installs per app
 
-        # List of all apps
-        all_apps = app_names_versions(kandji_device_ids)
+        # Installs per app and version
+        all_apps = app_names_versions(kandji_device_ids, arguments)
 
         # This header variable just makes formatting easier in the print statement
         output_header = "{:<25s}{:^20s}{:^20s}".format(
@@ -162,34 +272,41 @@ def main():
         print(f"{output_header}")
         print("-" * len(output_header))
 
-        # List of unique apps
-        unique_apps = []
-
-        # Loop over the all_apps list
-        # If the app is not in the
-        for app in all_apps:
-            if app not in unique_apps:
-                print(
-                    "{:<25s}{:^20s}{:^20s}".format(
-                        f"{app['app_name']}",
-                        f"{app['version']}",
-                        f"{all_apps.count(app)}",
-                    )
+        # Print the apps with the most installs first. With --top only the first N
+        # apps are printed.
+        for (app_name, version), installs in all_apps.most_common(arguments.top):
+            print(
+                "{:<25s}{:^20s}{:^20s}".format(
+                    f"{app_name}",
+                    f"{version}",
+                    f"{installs}",
                 )
-                unique_apps.append(app)
+            )
 
     if arguments.device_status:
         # Loop over all devices in Kandji and print the status information
-        for device_id in kandji_device_ids:
-            all_status_items = kandjiapi.get_device_status(BASE_URL, HEADERS, device_id)
-
+        for all_status_items in kandjiapi.get_each_device_status(
+            BASE_URL,
+            HEADERS,
+            kandji_device_ids,
+            workers=arguments.workers,
+            use_async=arguments.use_async,
+        ):
             print(all_status_items["library_items"])
             print(all_status_items["parameters"])
 
-    # if arguments.create_report:
-    #     # Create a report
-    #     print("This will create a report containing ...")
-    #     print("computer_name    guid    serial_number   blueprint   username")
+    if arguments.report:
+        # Create a report with details, apps, and status for every device
+        print("Generating device report...")
+        report_name = arguments.report
+
+        if arguments.report_format:
+            # Use the file extension of the report format given with --format
+            report_name = report.report_path(report_name, arguments.report_format)
+
+        count = write_report(kandji_device_inventory, report_name, arguments)
+        print(f"Total records in report: {count}")
+        print(f"Kandji report at: {pathlib.Path(report_name).resolve()}\n")
 
 
 if __name__ == "__main__":
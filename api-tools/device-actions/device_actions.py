@@ -49,19 +49,20 @@ import random
 import sys
 from datetime import datetime
 
-# 3rd party imports
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
 
 try:
-    import requests
+    from kandjilib import client, inventory
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run  "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -98,6 +99,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Current working directory
 HERE = pathlib.Path("__file__").parent.absolute()
 
@@ -251,54 +255,6 @@ def program_arguments():
     return parser.parse_args()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device it could be because the device is "
-            "not longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
-
-
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -309,70 +265,17 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
 
 def get_devices(params=None, ordering="serial_number"):
-    """Return device inventory."""
-    count = 0
-    # limit - set the number of records to return per API call
-    limit = 300
-    # offset - set the starting point within a list of resources
-    offset = 0
-    # inventory
-    data = []
-
-    while True:
-        # update params
-        params.update(
-            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
-        )
-
-        # check to see if a platform was specified
-        response = kandji_api(method="GET", endpoint="/v1/devices", params=params)
+    """Return device inventory.
 
-        count += len(response)
-        offset += limit
-        if len(response) == 0:
-            break
-
-        # breakout the response then append to the data list
-        for record in response:
-            data.append(record)
-
-    if len(data) < 1:
-        print("No devices found...\n")
-        sys.exit()
-
-    return data
+    Actions are sent to real devices, so the devices are always read from Kandji and
+    never from a local inventory snapshot, which can lag behind blueprint changes and
+    removed devices.
+    """
+    return inventory.get_devices(CLIENT, params=params, ordering=ordering)
 
 
 def get_blueprint(bp_name=None):
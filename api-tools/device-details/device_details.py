@@ -43,24 +43,26 @@ __version__ = "0.1.2"
 
 # Standard library
 import argparse
-import csv
 import pathlib
 import sys
 from datetime import datetime
 
-# 3rd party imports
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
 
 try:
-    import requests
+    from kandjilib import cli, client, filters, inventory, report
+    from kandjilib.fanout import fetch_each
+    from kandjilib.flatten import flatten
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run  "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -97,6 +99,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Current working directory
 HERE = pathlib.Path("__file__").parent.absolute()
 
@@ -262,6 +267,12 @@ def program_arguments():
         required=False,
     )
 
+    cli.add_performance_arguments(parser)
+    cli.add_inventory_arguments(parser)
+    cli.add_checkpoint_arguments(parser)
+    cli.add_filter_arguments(parser, example="general.os_version^=14.")
+    cli.add_report_arguments(parser)
+
     parser.version = __version__
     parser.add_argument("--version", action="version", help="Show this tool's version.")
     # parser.add_argument("-v", "--verbose", action="store", metavar="LEVEL")
@@ -277,54 +288,6 @@ def program_arguments():
     return parser.parse_args()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device, it could be because the device is "
-            "no longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
-
-
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -335,82 +298,14 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
 
-def get_devices(params=None, ordering="serial_number"):
-    """Return device inventory."""
-    # limit - set the number of records to return per API call
-    limit = 300
-    # offset - set the starting point within a list of resources
-    offset = 0
-    # inventory
-    data = []
-
-    while True:
-        # update params
-        params.update(
-            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
-        )
-
-        # check to see if a platform was specified
-        response = kandji_api(method="GET", endpoint="/v1/devices", params=params)
-
-        offset += limit
-        if len(response) == 0:
-            break
-
-        # breakout the response then append to the data list
-        for record in response:
-            data.append(record)
-
-    if len(data) < 1:
-        print("No devices found...\n")
-        sys.exit()
-
-    return data
-
-
-def get_device_details(devices, _all=False):
-    """Return device details."""
-    # list to hold all device detail records
-    data = []
-    # Get device details for each device
-    count = 0
-
-    for device in devices:
-        response = kandji_api(
-            method="GET", endpoint=f"/v1/devices/{device['device_id']}/details"
-        )
+def get_device_details(devices, _all=False, workers=None, use_async=False):
+    """Yield device details."""
 
+    def device_details(device, response):
+        """Return the details for a single device."""
         if not _all:
             # remove the keys we want to exclude from the response
             del response["volumes"]
@@ -419,10 +314,22 @@ def get_device_details(devices, _all=False):
 
         update_ade_dict(_input=response)
         update_hardware_overview_dict(_input=response)
-        data.append(response)
-        count += 1
 
-    return data
+        return response
+
+    # Get device details for several devices at a time. Records come back in the same
+    # order as the device inventory and are yielded as they arrive. Devices whose
+    # details could not be returned are left out of the report.
+    for record in fetch_each(
+        CLIENT,
+        devices,
+        "/v1/devices/{device_id}/details",
+        device_details,
+        workers=workers,
+        use_async=use_async,
+    ):
+        if record is not None:
+            yield record
 
 
 def update_ade_dict(_input):
@@ -489,90 +396,15 @@ def get_blueprint(bp_name=None):
     return blueprint_id
 
 
-def flatten(input_dict, separator=".", prefix=""):
-    """Flatten JSON."""
-    output_dict = {}
-
-    for key, value in input_dict.items():
-
-        # Check to see if the JSON value is a dict type. If it is then we we need to break the
-        # JSON structure out more.
-        if isinstance(value, dict) and value:
-            deeper = flatten(value, separator, prefix + key + separator)
-
-            # update the dictionary with the new structure.
-            output_dict.update({key2: val2 for key2, val2 in deeper.items()})
-
-        # If the JSON value is a list then loop over and see if we need to break out any values
-        # contained in the list.
-        elif isinstance(value, list) and value:
-            for index, sublist in enumerate(value, start=1):
-                # Check to see if the JSON value is a dict type. If it is then we we need to
-                # break the JSON structure out more.
-                if isinstance(sublist, dict) and sublist:
-                    deeper = flatten(
-                        sublist,
-                        separator,
-                        prefix + key + separator + str(index) + separator,
-                    )
-
-                    # update the dictionary with the new structure.
-                    output_dict.update({key2: val2 for key2, val2 in deeper.items()})
-
-                else:
-                    output_dict[prefix + key + separator + str(index)] = value
-
-        else:
-            output_dict[prefix + key] = value
-
-    return output_dict
-
-
 def generate_report_payload(_input, details_param=None):
-    """Create a JSON payload."""
-    report_payload = []
+    """Yield a flattened report row for each record that matches details_param."""
+    # Only the values at the paths in details_param are read from each record, so
+    # records that do not match are never flattened.
+    matches = filters.compile_filter(details_param or {})
 
     for record in _input:
-        flattened = flatten(record)
-        if details_param:
-            if details_param.items() <= flattened.items():
-                report_payload.append(flattened)
-
-        else:
-            report_payload.append(flattened)
-
-    return report_payload
-
-
-def write_report(_input, report_name, sort_by="serial_number"):
-    """Write the report."""
-    with open(report_name, mode="w", encoding="utf-8") as report:
-
-        out_fields = []
-
-        for item in _input:
-            for key in item.keys():
-                if key not in out_fields:
-                    out_fields.append(key)
-
-        # find the "sort_by" field so that we can sort the report on that.
-        def thingy(out_field):
-            this = ""
-            if sort_by in out_field:
-                this = sort_by
-            return this
-
-        writer = csv.DictWriter(
-            report, fieldnames=sorted(out_fields, key=thingy, reverse=True)
-        )
-
-        # Write headers to CSV
-        writer.writeheader()
-
-        # Loop over the item list
-        for item in _input:
-            # Write row to csv file
-            writer.writerow(item)
+        if matches(record):
+            yield flatten(record)
 
 
 def main():
@@ -580,6 +412,9 @@ def main():
 
     # Return the arguments
     arguments = program_arguments()
+    cli.apply_performance_arguments(CLIENT, arguments)
+    cli.apply_inventory_arguments(CLIENT, arguments)
+    cli.apply_checkpoint_arguments(CLIENT, arguments)
 
     # validate vars
     var_validation()
@@ -729,10 +564,17 @@ def main():
         report_name_items.append(f"{arguments.platform.lower()}")
         device_params.update({"platform": f"{arguments.platform}"})
 
+    for path, test in arguments.filter or []:
+        looking_for.append(f"{path}: {test!r}")
+
     # Get all device inventory records
     print("Getting device inventory from Kandji...")
-    device_inventory = get_devices(params=device_params)
-    print(f"Total records: {len(device_inventory)}")
+    # Device records are streamed as each page of inventory arrives so that per-device
+    # requests start before the whole inventory has been downloaded.
+    # Only the fields this report reads are kept for each device.
+    device_inventory = inventory.stream_devices(
+        CLIENT, params=device_params, fields=inventory.SUMMARY_FIELDS
+    )
 
     print(f"Query: {', '.join(looking_for)}")
 
@@ -740,20 +582,21 @@ def main():
         # return device details for each record returned in the inventory
         print("Getting all details for all devices...")
         print("No filters will be applied...")
-        device_details = get_device_details(devices=device_inventory, _all=True)
+        device_details = get_device_details(
+            devices=device_inventory,
+            _all=True,
+            workers=arguments.workers,
+            use_async=arguments.use_async,
+        )
 
     else:
         # return device details for each record returned in the inventory
         print("Getting device record details...")
-        device_details = get_device_details(devices=device_inventory)
-
-    # search device details output
-    if details_param:
-        report_payload = generate_report_payload(
-            _input=device_details, details_param=details_param
+        device_details = get_device_details(
+            devices=device_inventory,
+            workers=arguments.workers,
+            use_async=arguments.use_async,
         )
-    else:
-        report_payload = generate_report_payload(_input=device_details)
 
     # build report name
     if report_name_items:
@@ -763,15 +606,37 @@ def main():
     else:
         report_name = f"device_details_report_{TODAY}.csv"
 
-    print(f"Total records in report: {len(report_payload)}")
+    # Use the file extension of the report format given with --format
+    report_name = report.report_path(report_name, arguments.report_format)
+
+    # search device details output. --filter is applied along with the search options.
+    report_payload = generate_report_payload(
+        _input=device_details,
+        details_param=list(details_param.items()) + (arguments.filter or []),
+    )
+
+    # Rows are written to the report as the details for each device arrive, so the
+    # details of every device are never held in memory at once. The columns containing
+    # serial_number come first.
+    writer = report.open_report(report_name, order=report.lead_columns("serial_number"))
+    writer.writerows(report_payload)
+
+    if device_inventory.count < 1:
+        writer.discard()
+        print("No devices found...\n")
+        sys.exit()
+
+    print(f"Total records: {device_inventory.count}")
+    print(f"Total records in report: {writer.count}")
 
-    if len(report_payload) < 1:
+    if writer.count < 1:
+        writer.discard()
         print("No device found with matching search criteria")
         print("No report generated")
         sys.exit()
 
     print("Generating device report...")
-    write_report(_input=report_payload, report_name=report_name)
+    writer.close()
 
     print(f"Kandji report at: {HERE.resolve()}/{report_name}\n")
 
@@ -36,22 +36,25 @@ __version__ = "1.2.1"
 
 # Standard library
 import argparse
-import csv
 import pathlib
 import sys
 from datetime import datetime
 
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 try:
-    import requests
+    from kandjilib import cli, client, inventory, report
+    from kandjilib.fanout import fetch_each
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -88,6 +91,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Current working directory
 HERE = pathlib.Path("__file__").parent
 
@@ -149,6 +155,11 @@ def program_arguments():
         required=False,
     )
 
+    cli.add_performance_arguments(parser)
+    cli.add_inventory_arguments(parser)
+    cli.add_checkpoint_arguments(parser)
+    cli.add_report_arguments(parser)
+
     parser.version = __version__
     parser.add_argument("--version", action="version", help="Show this tool's version.")
     # parser.add_argument("-v", "--verbose", action="store", metavar="LEVEL")
@@ -162,54 +173,6 @@ def program_arguments():
     return parser.parse_args()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device, it could be because the device is "
-            "no longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
-
-
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -220,70 +183,7 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
-
-
-def get_devices(params=None, ordering="serial_number"):
-    """Return device inventory."""
-    count = 0
-    # limit - set the number of records to return per API call
-    limit = 300
-    # offset - set the starting point within a list of resources
-    offset = 0
-    # inventory
-    data = []
-
-    while True:
-        # update params
-        params.update(
-            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
-        )
-
-        # check to see if a platform was specified
-        response = kandji_api(method="GET", endpoint="/v1/devices", params=params)
-
-        count += len(response)
-        offset += limit
-        if len(response) == 0:
-            break
-
-        # breakout the response then append to the data list
-        for record in response:
-            data.append(record)
-
-    if len(data) < 1:
-        print("No devices found...\n")
-        sys.exit()
-
-    return data
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
 
 def device_status_category(data, category):
@@ -291,40 +191,56 @@ def device_status_category(data, category):
     return data[category]
 
 
-def write_report(_input, report_name, sort_by="serial_number"):
-    """Write the report."""
-    with open(report_name, mode="w", encoding="utf-8") as report:
-
-        out_fields = []
+def device_library_item_records(device, lib_items_data, arguments):
+    """Return the library item records for a single device."""
+    report_payload = []
 
-        for item in _input:
-            for key in item.keys():
-                if key not in out_fields:
-                    out_fields.append(key)
+    library_items = device_status_category(lib_items_data, "library_items")
+
+    for item in library_items:
+
+        # these are all the fields that will be used in the report
+        item_info = {
+            "serial_number": device["serial_number"].upper(),
+            "device_name": device["device_name"],
+            "blueprint_name": device["blueprint_name"],
+            "os_version": device["os_version"],
+            "user": device["user"],
+            "name": item["name"],
+            "status": item["status"],
+            "type": item["type"],
+            "reported_at": item["reported_at"],
+            "last_audit_run": item["last_audit_run"],
+            "last_audit_log": item["last_audit_log"],
+            "control_reported_at": item["control_reported_at"],
+            "control_log": item["control_log"],
+            "log": item["log"],
+        }
+
+        # if a specific lit is specified then we only want to build a report
+        # containing that name only.
+        if arguments.library_item:
+            if item["name"] == arguments.library_item:
+                report_payload.append(item_info)
 
-        # find the "sort_by" field so that we can sort the report on that.
-        def thingy(out_field):
-            this = ""
-            if sort_by in out_field:
-                this = sort_by
-            return this
+        else:
+            report_payload.append(item_info)
 
-        writer = csv.DictWriter(
-            report, fieldnames=sorted(out_fields, key=thingy, reverse=True)
-        )
+    return report_payload
 
-        # Write headers to CSV
-        writer.writeheader()
 
-        # Loop over the item list
-        for item in _input:
-            # Write row to csv file
-            writer.writerow(item)
+def write_report(_input, report_name, sort_by="serial_number"):
+    """Write the report."""
+    # The columns containing the "sort_by" field come first
+    report.write_report(_input, report_name, order=report.lead_columns(sort_by))
 
 
 def main():
     """Run main logic."""
     arguments = program_arguments()
+    cli.apply_performance_arguments(CLIENT, arguments)
+    cli.apply_inventory_arguments(CLIENT, arguments)
+    cli.apply_checkpoint_arguments(CLIENT, arguments)
 
     var_validation()
 
@@ -358,49 +274,40 @@ def main():
                 f"{arguments.platform.lower()}_all_library_items_report_{TODAY}.csv"
             )
 
+    # Use the file extension of the report format given with --format
+    report_name = report.report_path(report_name, arguments.report_format)
+
     # Get all device inventory records
     print("Getting device inventory from Kandji...")
-    device_inventory = get_devices(params=params_dict)
-    print(f"Total device records: {len(device_inventory)}")
+    # Device records are streamed as each page of inventory arrives so that per-device
+    # requests start before the whole inventory has been downloaded.
+    # Only the fields this report reads are kept for each device.
+    device_inventory = inventory.stream_devices(
+        CLIENT, params=params_dict, fields=inventory.SUMMARY_FIELDS
+    )
 
     report_payload = []
 
-    for device in device_inventory:
-        # We are looking for a library item
+    # Look up the library items for several devices at a time. Results come back in
+    # the same order as the device inventory.
+    for device_records in fetch_each(
+        CLIENT,
+        device_inventory,
+        "/v1/devices/{device_id}/library-items",
+        lambda device, response: device_library_item_records(
+            device, response, arguments
+        ),
+        workers=arguments.workers,
+        use_async=arguments.use_async,
+        skipped=[],
+    ):
+        report_payload.extend(device_records)
 
-        lib_items_data = kandji_api(
-            method="GET", endpoint=f"/v1/devices/{device['device_id']}/library-items"
-        )
-        library_items = device_status_category(lib_items_data, "library_items")
-
-        for item in library_items:
-
-            # these are all the fields that will be used in the report
-            item_info = {
-                "serial_number": device["serial_number"].upper(),
-                "device_name": device["device_name"],
-                "blueprint_name": device["blueprint_name"],
-                "os_version": device["os_version"],
-                "user": device["user"],
-                "name": item["name"],
-                "status": item["status"],
-                "type": item["type"],
-                "reported_at": item["reported_at"],
-                "last_audit_run": item["last_audit_run"],
-                "last_audit_log": item["last_audit_log"],
-                "control_reported_at": item["control_reported_at"],
-                "control_log": item["control_log"],
-                "log": item["log"],
-            }
-
-            # if a specific lit is specified then we only want to build a report
-            # containing that name only.
-            if arguments.library_item:
-                if item["name"] == search_term:
-                    report_payload.append(item_info)
-
-            else:
-                report_payload.append(item_info)
+    if device_inventory.count < 1:
+        print("No devices found...\n")
+        sys.exit()
+
+    print(f"Total device records: {device_inventory.count}")
 
     if len(report_payload) < 1:
         print(f"No devices found with {search_term} in scope...")
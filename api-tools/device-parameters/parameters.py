@@ -41,22 +41,26 @@ __version__ = "0.0.2"
 
 
 # Standard library
-import csv
+import argparse
 import pathlib
 import sys
 from datetime import datetime
 
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 try:
-    import requests
+    from kandjilib import cli, client, inventory, report
+    from kandjilib.fanout import fetch_each
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run  "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -90,6 +94,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Current working directory
 HERE = pathlib.Path("__file__").parent.absolute()
 
@@ -110,52 +117,22 @@ def var_validation():
         sys.exit()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device, it could be because the device is "
-            "no longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
+def program_arguments():
+    """Return arguments."""
+    parser = argparse.ArgumentParser(
+        prog="parameters",
+        description="Generate a report of the parameters assigned to each device.",
+        allow_abbrev=False,
+    )
+
+    cli.add_performance_arguments(parser)
+    cli.add_inventory_arguments(parser)
+    cli.add_report_arguments(parser)
+
+    parser.version = __version__
+    parser.add_argument("--version", action="version", help="Show this tool's version.")
+
+    return parser.parse_args()
 
 
 def kandji_api(method, endpoint, params=None, payload=None):
@@ -168,95 +145,40 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
-
-
-def get_devices(params=None, ordering="serial_number"):
-    """Return device inventory."""
-    count = 0
-    # limit - set the number of records to return per API call
-    limit = 300
-    # offset - set the starting point within a list of resources
-    offset = 0
-    # inventory
-    data = []
-
-    while True:
-        # update params
-        params.update(
-            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
-        )
-
-        # check to see if a platform was specified
-        response = kandji_api(method="GET", endpoint="/v1/devices", params=params)
 
-        count += len(response)
-        offset += limit
-        if len(response) == 0:
-            break
-
-        # breakout the response then append to the data list
-        for record in response:
-            data.append(record)
+def device_parameter_records(device, parameters):
+    """Return the parameters assigned to a single device."""
+    # holds device name, serial number, blueprint, param name, param id.
+    report_payload = []
 
-    if len(data) < 1:
-        print("No devices found...\n")
-        sys.exit()
+    for param in parameters["parameters"]:
+        # report dict
+        data = {
+            "device_name": f"{device['device_name']}",
+            "serial_number": f"{device['serial_number']}",
+            "blueprint_name": f"{device['blueprint_name']}",
+            "param_name": f"{param['name']}",
+            "param_id": f"{param['item_id']}",
+        }
+        report_payload.append(data)
 
-    return data
+    return report_payload
 
 
 def write_report(input_, report_name):
     """Write report."""
-    with open(report_name, mode="w", encoding="utf-8") as report:
-        # headers
-        out_fields = []
-        # automatically loop over keys in the payload to pullout header fields
-        for item in input_:
-            for key in item.keys():
-                if key not in out_fields:
-                    out_fields.append(key)
-
-        writer = csv.DictWriter(report, fieldnames=out_fields)
-
-        # Write headers to CSV
-        writer.writeheader()
-
-        # Loop over the list sorted by serial_number
-        for item in input_:
-            writer.writerow(item)
+    report.write_report(input_, report_name)
 
 
 def main():
     """Run main logic."""
+    # Return the arguments
+    arguments = program_arguments()
+    cli.apply_performance_arguments(CLIENT, arguments)
+    cli.apply_inventory_arguments(CLIENT, arguments)
+
     # validate vars
     var_validation()
 
@@ -267,10 +189,20 @@ def main():
     # dict placeholder for params passed to api requests
     params_dict = {}
 
+    # Use the file extension of the report format given with --format
+    report_name = report.report_path(
+        f"device_params_report_{datetime.today().strftime('%Y%m%d')}.csv",
+        arguments.report_format,
+    )
+
     # Get all device inventory records
     print("Getting device inventory from Kandji...")
-    device_inventory = get_devices(params=params_dict)
-    print(f"Total device records returned: {len(device_inventory)}")
+    # Device records are streamed as each page of inventory arrives so that per-device
+    # requests start before the whole inventory has been downloaded.
+    # Only the fields this report reads are kept for each device.
+    device_inventory = inventory.stream_devices(
+        CLIENT, params=params_dict, fields=inventory.SUMMARY_FIELDS
+    )
 
     # holds device name, serial number, blueprint, param name, param id.
     report_payload = []
@@ -278,35 +210,34 @@ def main():
     # devices with params assigned
     param_count = 0
 
-    for device in device_inventory:
-        parameters = kandji_api("GET", f"/v1/devices/{device['device_id']}/parameters")
-
+    # Look up the parameters for several devices at a time. Results come back in the
+    # same order as the device inventory.
+    for device_records in fetch_each(
+        CLIENT,
+        device_inventory,
+        "/v1/devices/{device_id}/parameters",
+        device_parameter_records,
+        workers=arguments.workers,
+        use_async=arguments.use_async,
+        skipped=[],
+    ):
         # if the parameters list is populated
-        if parameters["parameters"]:
-            for param in parameters["parameters"]:
-                # report dict
-                data = {
-                    "device_name": f"{device['device_name']}",
-                    "serial_number": f"{device['serial_number']}",
-                    "blueprint_name": f"{device['blueprint_name']}",
-                    "param_name": f"{param['name']}",
-                    "param_id": f"{param['item_id']}",
-                }
-                report_payload.append(data)
+        if device_records:
+            report_payload.extend(device_records)
 
             # increment counter
             param_count += 1
 
+    if device_inventory.count < 1:
+        print("No devices found...\n")
+        sys.exit()
+
+    print(f"Total device records returned: {device_inventory.count}")
     print(f"Total devices with parameters assigned: {param_count}")
     print("Generating device report...")
-    write_report(
-        input_=report_payload,
-        report_name=f"device_params_report_{datetime.today().strftime('%Y%m%d')}.csv",
-    )
+    write_report(input_=report_payload, report_name=report_name)
 
-    print(
-        f"Kandji report at: {HERE.resolve()}/device_params_report_{datetime.today().strftime('%Y%m%d')}.csv\n"
-    )
+    print(f"Kandji report at: {HERE.resolve()}/{report_name}\n")
 
 
 if __name__ == "__main__":
@@ -41,24 +41,26 @@ __version__ = "0.0.8"
 
 # Standard library
 import argparse
-import csv
 import pathlib
 import sys
 from datetime import datetime
 
-# 3rd party imports
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
 
 try:
-    import requests
+    from kandjilib import cli, client, inventory, report
+    from kandjilib.fanout import fetch_each
+    from kandjilib.flatten import flatten
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run  "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -94,6 +96,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Current working directory
 HERE = pathlib.Path("__file__").parent.absolute()
 
@@ -201,6 +206,10 @@ def program_arguments():
         required=False,
     )
 
+    cli.add_performance_arguments(parser)
+    cli.add_inventory_arguments(parser)
+    cli.add_report_arguments(parser)
+
     parser.version = __version__
     parser.add_argument("--version", action="version", help="Show this tool's version.")
 
@@ -216,54 +225,6 @@ def program_arguments():
     return parser.parse_args()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device it could be because the device is "
-            "not longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
-
-
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -274,70 +235,12 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
 
 def get_devices(params=None, ordering="serial_number"):
     """Return device inventory."""
-    count = 0
-    # limit - set the number of records to return per API call
-    limit = 300
-    # offset - set the starting point within a list of resources
-    offset = 0
-    # inventory
-    data = []
-
-    while True:
-        # update params
-        params.update(
-            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
-        )
-
-        # check to see if a platform was specified
-        response = kandji_api(method="GET", endpoint="/v1/devices", params=params)
-
-        count += len(response)
-        offset += limit
-        if len(response) == 0:
-            break
-
-        # breakout the response then append to the data list
-        for record in response:
-            data.append(record)
-
-    if len(data) < 1:
-        print("No devices found...\n")
-        sys.exit()
-
-    return data
+    return inventory.get_devices(CLIENT, params=params, ordering=ordering)
 
 
 def get_blueprint(bp_name=None):
@@ -375,13 +278,29 @@ def get_blueprint(bp_name=None):
     return blueprint_id
 
 
-def get_device_secrets(devices, secrets):
+def get_device_secrets(devices, secrets, workers=None, use_async=False):
     """Return device secrets."""
     # list to hold all device secrets
     data = []
 
     count = 0
 
+    # One request is made for each device and secret. Requests for several devices run
+    # at the same time and the responses come back in the order they were requested.
+    responses = fetch_each(
+        CLIENT,
+        (
+            {"device_id": device["device_id"], "secret": secret}
+            for device in devices
+            for secret in secrets
+        ),
+        "/v1/devices/{device_id}/secrets/{secret}",
+        lambda item, response: response,
+        workers=workers,
+        use_async=use_async,
+        skipped={},
+    )
+
     for device in devices:
         # this should contain the device serial_number plus any relevent secrets.
         device_secrets = {}
@@ -394,10 +313,7 @@ def get_device_secrets(devices, secrets):
         device_secrets.update({"platform": device.get("platform")})
 
         for secret in secrets:
-            response = kandji_api(
-                method="GET",
-                endpoint=f"/v1/devices/{device['device_id']}/secrets/{secret}",
-            )
+            response = next(responses)
 
             if secret == "bypasscode":
                 for item in response:
@@ -413,53 +329,15 @@ def get_device_secrets(devices, secrets):
     return data
 
 
-def flatten(input_dict, separator="_", prefix=""):
-    """Flatten JSON."""
-    output_dict = {}
-
-    for key, value in input_dict.items():
-        # Check to see if the JSON value is a dict type. If it is then we we need to
-        # break the JSON structure out more.
-        if isinstance(value, dict) and value:
-            deeper = flatten(value, separator, prefix + key + separator)
-
-            # update the dictionary with the new structure.
-            output_dict.update({key2: val2 for key2, val2 in deeper.items()})
-
-        # If the JSON value is a list then loop over and see if we need to break out
-        # any values contained in the list.
-        elif isinstance(value, list) and value:
-            for index, sublist in enumerate(value, start=1):
-                # Check to see if the JSON value is a dict type. If it is then we we
-                # need to break the JSON structure out more.
-                if isinstance(sublist, dict) and sublist:
-                    deeper = flatten(
-                        sublist,
-                        separator,
-                        prefix + key + separator + str(index) + separator,
-                    )
-
-                    # update the dictionary with the new structure.
-                    output_dict.update({key2: val2 for key2, val2 in deeper.items()})
-
-                else:
-                    output_dict[prefix + key + separator + str(index)] = value
-
-        else:
-            output_dict[prefix + key] = value
-
-    # cleanup any fields that we do not need because theyve been flattened.
-    output_dict.pop("user", None)
-
-    return output_dict
-
-
 def generate_report_payload(_input, details_param=None):
     """Create a JSON payload."""
     report_payload = []
 
     for record in _input:
-        flattened = flatten(record)
+        flattened = flatten(record, separator="_")
+
+        # cleanup any fields that we do not need because theyve been flattened.
+        flattened.pop("user", None)
 
         if details_param:
             details_param_keys = list(details_param.keys())
@@ -477,32 +355,8 @@ def generate_report_payload(_input, details_param=None):
 
 def write_report(_input, report_name, sort_by="serial_number"):
     """Write the report."""
-    with open(report_name, mode="w", encoding="utf-8") as report:
-        out_fields = []
-
-        for item in _input:
-            for key in item.keys():
-                if key not in out_fields:
-                    out_fields.append(key)
-
-        # find the "sort_by" field so that we can sort the report on that.
-        def thingy(out_field):
-            this = ""
-            if sort_by in out_field:
-                this = sort_by
-            return this
-
-        writer = csv.DictWriter(
-            report, fieldnames=sorted(out_fields, key=thingy, reverse=True)
-        )
-
-        # Write headers to CSV
-        writer.writeheader()
-
-        # Loop over the item list
-        for item in _input:
-            # Write row to csv file
-            writer.writerow(item)
+    # The columns containing the "sort_by" field come first
+    report.write_report(_input, report_name, order=report.lead_columns(sort_by))
 
 
 def main():
@@ -512,6 +366,8 @@ def main():
 
     # Return the arguments
     arguments = program_arguments()
+    cli.apply_performance_arguments(CLIENT, arguments)
+    cli.apply_inventory_arguments(CLIENT, arguments)
 
     print(f"\nVersion: {__version__}")
     print(f"Base URL: {BASE_URL}\n")
@@ -576,7 +432,12 @@ def main():
 
     # secrets
     print("Running query...hang tight.")
-    device_secrets = get_device_secrets(devices=device_inventory, secrets=secrets)
+    device_secrets = get_device_secrets(
+        devices=device_inventory,
+        secrets=secrets,
+        workers=arguments.workers,
+        use_async=arguments.use_async,
+    )
 
     # build report name
     if report_name_items:
@@ -586,6 +447,9 @@ def main():
     else:
         report_name = f"device_secrets_{TODAY}.csv"
 
+    # Use the file extension of the report format given with --format
+    report_name = report.report_path(report_name, arguments.report_format)
+
     # build the report payload
     report_payload = generate_report_payload(_input=device_secrets)
 
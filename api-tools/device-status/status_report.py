@@ -45,22 +45,25 @@ __version__ = "1.0.2"
 
 # Standard library
 import argparse
-import csv
 import pathlib
 import sys
 from datetime import datetime
 
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 try:
-    import requests
+    from kandjilib import cli, client, inventory, report
+    from kandjilib.fanout import fetch_each
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run  "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -96,6 +99,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Current working directory
 HERE = pathlib.Path("__file__").parent.absolute()
 
@@ -143,6 +149,10 @@ def program_arguments():
         required=False,
     )
 
+    cli.add_performance_arguments(parser)
+    cli.add_inventory_arguments(parser)
+    cli.add_report_arguments(parser)
+
     parser.version = __version__
     parser.add_argument("--version", action="version", help="Show this tool's version.")
     # parser.add_argument("-v", "--verbose", action="store", metavar="LEVEL")
@@ -156,54 +166,6 @@ def program_arguments():
     return parser.parse_args()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device, it could be because the device is "
-            "no longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
-
-
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -214,150 +176,81 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
-
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
-def get_devices(params=None, ordering="serial_number"):
-    """Return device inventory."""
-    # limit - set the number of records to return per API call
-    limit = 300
-    # offset - set the starting point within a list of resources
-    offset = 0
-    # inventory
-    data = []
 
-    while True:
-        # update params
-        params.update(
-            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
-        )
-
-        # check to see if a platform was specified
-        response = kandji_api(method="GET", endpoint="/v1/devices", params=params)
-
-        offset += limit
-        if len(response) == 0:
-            break
-
-        # breakout the response then append to the data list
-        for record in response:
-            data.append(record)
+def device_status_category(data, category):
+    """Return the device library items."""
+    return data[category]
 
-    if len(data) < 1:
-        print("No devices found...\n")
-        sys.exit()
 
-    return data
+def device_status_records(device, status_data, args, search_term):
+    """Return the status records matching the search term for a single device."""
+    report_payload = []
 
+    if args.library_item:
+        # We are looking for a library item
+        library_items = device_status_category(status_data, "library_items")
+        for item in library_items:
+            if item["name"] == search_term:
+                item_info = {
+                    "serial_number": device["serial_number"].upper(),
+                    "device_name": device["device_name"],
+                    "blueprint_name": device["blueprint_name"],
+                    "name": item["name"],
+                    "status": item["status"],
+                    "type": item["type"],
+                    "reported_at": item["reported_at"],
+                    "last_audit_log": item["last_audit_log"],
+                    "log": item["log"],
+                }
+                report_payload.append(item_info)
+
+    if args.parameter:
+        # We are looking for a parameter
+        parameter_items = device_status_category(status_data, "parameters")
+        for item in parameter_items:
+            if item["name"] == search_term:
+                item_info = {
+                    "serial_number": device["serial_number"].upper(),
+                    "device_name": device["device_name"],
+                    "blueprint_name": device["blueprint_name"],
+                    "status": item["status"],
+                    "name": item["name"],
+                    "category": item["category"],
+                    "subcategory": item["subcategory"],
+                }
+                report_payload.append(item_info)
 
-def device_status_category(data, category):
-    """Return the device library items."""
-    return data[category]
+    return report_payload
 
 
 def generate_report_payload(_input, args, search_term):
     """Generate report payload."""
     report_payload = []
 
-    for device in _input:
-        status_data = kandji_api(
-            method="GET", endpoint=f"/v1/devices/{device['device_id']}/status"
-        )
-
-        if args.library_item:
-            # We are looking for a library item
-            library_items = device_status_category(status_data, "library_items")
-            for item in library_items:
-                if item["name"] == search_term:
-                    item_info = {
-                        "serial_number": device["serial_number"].upper(),
-                        "device_name": device["device_name"],
-                        "blueprint_name": device["blueprint_name"],
-                        "name": item["name"],
-                        "status": item["status"],
-                        "type": item["type"],
-                        "reported_at": item["reported_at"],
-                        "last_audit_log": item["last_audit_log"],
-                        "log": item["log"],
-                    }
-                    report_payload.append(item_info)
-
-        if args.parameter:
-            # We are looking for a parameter
-            parameter_items = device_status_category(status_data, "parameters")
-            for item in parameter_items:
-                if item["name"] == search_term:
-                    item_info = {
-                        "serial_number": device["serial_number"].upper(),
-                        "device_name": device["device_name"],
-                        "blueprint_name": device["blueprint_name"],
-                        "status": item["status"],
-                        "name": item["name"],
-                        "category": item["category"],
-                        "subcategory": item["subcategory"],
-                    }
-                    report_payload.append(item_info)
+    # Look up the status for several devices at a time. Results come back in the same
+    # order as the device inventory.
+    for device_records in fetch_each(
+        CLIENT,
+        _input,
+        "/v1/devices/{device_id}/status",
+        lambda device, response: device_status_records(
+            device, response, args, search_term
+        ),
+        workers=args.workers,
+        use_async=args.use_async,
+        skipped=[],
+    ):
+        report_payload.extend(device_records)
 
     return report_payload
 
 
 def write_report(_input, report_name, sort_by="serial_number"):
     """Write the report."""
-    with open(report_name, mode="w", encoding="utf-8") as report:
-
-        out_fields = []
-
-        for item in _input:
-            for key in item.keys():
-                if key not in out_fields:
-                    out_fields.append(key)
-
-        # find the "sort_by" field so that we can sort the report on that.
-        def thingy(out_field):
-            this = ""
-            if sort_by in out_field:
-                this = sort_by
-            return this
-
-        writer = csv.DictWriter(
-            report, fieldnames=sorted(out_fields, key=thingy, reverse=True)
-        )
-
-        # Write headers to CSV
-        writer.writeheader()
-
-        # Loop over the item list
-        for item in _input:
-            # Write row to csv file
-            writer.writerow(item)
+    # The columns containing the "sort_by" field come first
+    report.write_report(_input, report_name, order=report.lead_columns(sort_by))
 
 
 def main():
@@ -366,6 +259,8 @@ def main():
 
     # Return the arguments
     arguments = program_arguments()
+    cli.apply_performance_arguments(CLIENT, arguments)
+    cli.apply_inventory_arguments(CLIENT, arguments)
 
     print(f"\nVersion: {__version__}")
     print(f"Base URL: {BASE_URL}\n")
@@ -382,16 +277,29 @@ def main():
         report_name = f"{arguments.parameter.lower().replace(' ', '_')}_status_report_{datetime.today().strftime('%Y%m%d')}.csv"
         search_term = arguments.parameter
 
+    # Use the file extension of the report format given with --format
+    report_name = report.report_path(report_name, arguments.report_format)
+
     # Get all device inventory records
     print("Getting device inventory from Kandji...")
-    device_inventory = get_devices(params=params_dict)
-    print(f"Total records: {len(device_inventory)}\n")
+    # Device records are streamed as each page of inventory arrives so that per-device
+    # requests start before the whole inventory has been downloaded.
+    # Only the fields this report reads are kept for each device.
+    device_inventory = inventory.stream_devices(
+        CLIENT, params=params_dict, fields=inventory.SUMMARY_FIELDS
+    )
     print(f'Looking for the status of "{search_term}" ...')
 
     report_payload = generate_report_payload(
         _input=device_inventory, args=arguments, search_term=search_term
     )
 
+    if device_inventory.count < 1:
+        print("No devices found...\n")
+        sys.exit()
+
+    print(f"Total records: {device_inventory.count}\n")
+
     if len(report_payload) < 1:
         print(f"No items with name {search_term} ...")
         print("No report generated...")
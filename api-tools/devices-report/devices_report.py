@@ -43,25 +43,26 @@ __version__ = "1.1.0"
 
 # Standard library
 import argparse
-import csv
 import operator
 import pathlib
 import sys
 from datetime import datetime
 
-# Try to import the module. If the module cannot be imported let the user know so that
-# they can install it.
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 try:
-    import requests
+    from kandjilib import cli, client, filters, inventory, report
+    from kandjilib.flatten import flatten
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run  "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -97,6 +98,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Report name
 SCRIPT_NAME = "Device Report"
 TODAY = datetime.today().strftime("%Y%m%d")
@@ -142,6 +146,10 @@ def program_arguments():
         required=False,
     )
 
+    cli.add_inventory_arguments(parser)
+    cli.add_filter_arguments(parser, example="os_version>=14.2", separator="_")
+    cli.add_report_arguments(parser)
+
     parser.version = __version__
     parser.add_argument("--version", action="version", help="Show this tool's version.")
     # parser.add_argument("-v", "--verbose", action="store", metavar="LEVEL")
@@ -149,54 +157,6 @@ def program_arguments():
     return parser.parse_args()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device, it could be because the device is "
-            "no longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
-
-
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -207,176 +167,48 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
 
 def get_devices(params=None, ordering="serial_number"):
     """Return device inventory."""
-    count = 0
-    # limit - set the number of records to return per API call
-    limit = 300
-    # offset - set the starting point within a list of resources
-    offset = 0
-    # inventory
-    data = []
-
-    while True:
-        # update params
-        params.update(
-            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
-        )
-
-        # check to see if a platform was specified
-        response = kandji_api(method="GET", endpoint="/v1/devices", params=params)
-
-        count += len(response)
-        offset += limit
-        if len(response) == 0:
-            break
-
-        # breakout the response then append to the data list
-        for record in response:
-            data.append(record)
-
-    if len(data) < 1:
-        print("No devices found...\n")
-        sys.exit()
-
-    return data
-
-
-def flatten(input_dict, separator="_", prefix=""):
-    """Flatten JSON."""
-    output_dict = {}
-
-    for key, value in input_dict.items():
-
-        # Check to see if the JSON value is a dict type. If it is then we we need to break the
-        # JSON structure out more.
-        if isinstance(value, dict) and value:
-
-            deeper = flatten(value, separator, prefix + key + separator)
-
-            # update the dictionary with the new structure.
-            output_dict.update({key2: val2 for key2, val2 in deeper.items()})
-
-        # If the JSON value is a list then loop over and see if we need to break out any values
-        # contained in the list.
-        elif isinstance(value, list) and value:
-
-            for index, sublist in enumerate(value, start=1):
-
-                # Check to see if the JSON value is a dict type. If it is then we we need to
-                # break the JSON structure out more.
-                if isinstance(sublist, dict) and sublist:
-                    deeper = flatten(
-                        sublist,
-                        separator,
-                        prefix + key + separator + str(index) + separator,
-                    )
-
-                    # update the dictionary with the new structure.
-                    output_dict.update({key2: val2 for key2, val2 in deeper.items()})
-
-                else:
-                    output_dict[prefix + key + separator + str(index)] = value
-
-        else:
-            output_dict[prefix + key] = value
-
-    return output_dict
+    return inventory.get_devices(CLIENT, params=params, ordering=ordering)
 
 
 def generate_report_payload(_input, details_param=None):
-    """Create a JSON payload."""
-    report_payload = []
-
-    for record in _input:
-
-        flattened = flatten(record)
-
-        if details_param:
-
-            details_param_keys = list(details_param.keys())
-            details_param_values = list(details_param.values())
-
-            for key, value in flattened.items():
+    """Create a JSON payload of the records that match every filter in details_param.
 
-                if key == details_param_keys[0] and details_param_values[0] == value:
-
-                    report_payload.append(flattened)
-
-        else:
-            report_payload.append(flattened)
+    details_param - filters on the dotted key paths or report column names of each
+                    device record, as a dict or a list of (path, test) pairs. See
+                    kandjilib.filters.compile_filter.
+    """
+    # The filters are compiled once and only the filtered paths are read from each
+    # record, so records that do not match are never flattened.
+    matches = filters.compile_filter(details_param or {}, separator="_")
 
-    return report_payload
+    return [flatten(record, separator="_") for record in _input if matches(record)]
 
 
 def write_report(_input, report_name, sort_by="serial_number"):
     """Write the report."""
-    # write report to csv file
-
-    with open(report_name, mode="w", encoding="utf-8") as report:
-
-        out_fields = []
-
-        for item in _input:
-            for key in item.keys():
-                if key not in out_fields:
-                    out_fields.append(key)
 
-        # find the "sort_by" field so that we can sort the report on that.
-        def thingy(out_field):
-            this = ""
-            if sort_by in out_field:
-                this = out_field
-            return this
-
-        writer = csv.DictWriter(
-            report, fieldnames=sorted(out_fields, key=thingy, reverse=True)
+    # find the "sort_by" field so that we can sort the report on that.
+    def order(columns):
+        return sorted(
+            columns,
+            key=lambda column: column if sort_by in column else "",
+            reverse=True,
         )
 
-        # Write headers to CSV
-        writer.writeheader()
-
-        # Loop over the item list
-        for item in _input:
-            # Write row to csv file
-            writer.writerow(item)
+    # write report to csv file
+    report.write_report(_input, report_name, order=order)
 
 
 def main():
     """Run main logic."""
     # Return the arguments
     arguments = program_arguments()
+    cli.apply_inventory_arguments(CLIENT, arguments)
 
     var_validation()
 
@@ -394,6 +226,9 @@ def main():
     else:
         report_name = f"devices_report_{TODAY}.csv"
 
+    # Use the file extension of the report format given with --format
+    report_name = report.report_path(report_name, arguments.report_format)
+
     # Get all device inventory records
     print("Getting device inventory from Kandji...")
     device_inventory = get_devices(params=params_dict)
@@ -409,7 +244,16 @@ def main():
 
     # Get the app names and app versions from the app details by passing a list of
     # device ids
-    report_payload = generate_report_payload(device_info_list)
+    report_payload = generate_report_payload(
+        device_info_list, details_param=arguments.filter
+    )
+
+    if arguments.filter:
+        print(f"Total records matching the filters: {len(report_payload)}\n")
+
+        if len(report_payload) < 1:
+            print("No report generated...")
+            sys.exit()
 
     print("Generating device report for the following devices ...")
 
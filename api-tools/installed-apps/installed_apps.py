@@ -47,24 +47,25 @@ __version__ = "1.3.1"
 
 # Standard library
 import argparse
-import csv
 import pathlib
 import sys
 from datetime import datetime
 
-# Try to import the module. If the module cannot be imported let the user know so that
-# they can install it.
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 try:
-    import requests
+    from kandjilib import cli, client, inventory, prism, report
+    from kandjilib.fanout import fetch_each
 except ImportError as import_error:
     print(import_error)
     sys.exit(
-        "Looks like you need to install the requests module. Open a Terminal and run  "
-        "python3 -m pip install requests."
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
     )
 
-from requests.adapters import HTTPAdapter
-
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -100,6 +101,9 @@ HEADERS = {
     "Cache-Control": "no-cache",
 }
 
+# Pooled API client shared by every request this script makes
+CLIENT = client.KandjiClient(base_url=BASE_URL, headers=HEADERS)
+
 # Current working directory
 HERE = pathlib.Path("__file__").parent
 
@@ -140,6 +144,20 @@ def program_arguments():
         required=False,
     )
 
+    parser.add_argument(
+        "--source",
+        type=str,
+        choices=["devices", "prism"],
+        help="Where installed apps are read from. devices (the default) requests the "
+        "apps for each device. prism reads the fleet-wide Prism apps collection, 300 "
+        "apps per request.",
+        required=False,
+    )
+
+    cli.add_performance_arguments(parser)
+    cli.add_inventory_arguments(parser)
+    cli.add_report_arguments(parser)
+
     parser.version = __version__
     parser.add_argument("--version", action="version", help="Show this tool's version.")
     # parser.add_argument("-v", "--verbose", action="store", metavar="LEVEL")
@@ -147,54 +165,6 @@ def program_arguments():
     return parser.parse_args()
 
 
-def http_errors(resp, resp_code, err_msg):
-    """Handle HTTP errors."""
-    # 400
-    if resp_code == requests.codes["bad_request"]:
-        print(f"\n\t{err_msg}")
-        print(f"\tResponse msg: {resp.text}\n")
-    # 401
-    elif resp_code == requests.codes["unauthorized"]:
-        print("Make sure that you have the required permissions to access this data.")
-        print(
-            "Depending on the API platform this could mean that access has just been "
-            "blocked."
-        )
-        sys.exit(f"\t{err_msg}")
-    # 403
-    elif resp_code == requests.codes["forbidden"]:
-        print("The api key may be invalid or missing.")
-        sys.exit(f"\t{err_msg}")
-    # 404
-    elif resp_code == requests.codes["not_found"]:
-        print("\nWe cannot find the one that you are looking for...")
-        print("Move along...")
-        print(f"\tError: {err_msg}")
-        print(f"\tResponse msg: {resp}")
-        print(
-            "\tPossible reason: If this is a device, it could be because the device is "
-            "no longer\n"
-            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
-            "\t\t\t sent successfully.\n"
-        )
-    # 429
-    elif resp_code == requests.codes["too_many_requests"]:
-        print("You have reached the rate limit ...")
-        print("Try again later ...")
-        sys.exit(f"\t{err_msg}")
-    # 500
-    elif resp_code == requests.codes["internal_server_error"]:
-        print("The service is having a problem...")
-        sys.exit(err_msg)
-    # 503
-    elif resp_code == requests.codes["service_unavailable"]:
-        print("Unable to reach the service. Try again later...")
-    else:
-        print("Something really bad must have happened...")
-        print(err_msg)
-        sys.exit()
-
-
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -205,68 +175,40 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    attom_adapter = HTTPAdapter(max_retries=3)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
-
-
-def get_devices(params=None, ordering="serial_number"):
-    """Return device inventory."""
-    count = 0
-    # limit - set the number of records to return per API call
-    limit = 300
-    # offset - set the starting point within a list of resources
-    offset = 0
-    # inventory
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
+
+
+def app_record(device, app_name, bundle_id, version):
+    """Return a report record for an app installed on a device."""
+    # Create a dictionary containing the application name, version, and associated
+    # serial number.
+    return {
+        "serial_number": device["serial_number"].upper(),
+        "device_name": device["device_name"],
+        "blueprint_name": device["blueprint_name"],
+        "os_version": device["os_version"],
+        "user": device["user"],
+        "platform": device["platform"],
+        "app_name": app_name,
+        "bundle_id": bundle_id,
+        "version": version,
+    }
+
+
+def device_apps_records(device, device_apps, args):
+    """Return the report records for the apps installed on a single device."""
+    # list of apps
     data = []
 
-    while True:
-        # update params
-        params.update(
-            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
-        )
-
-        # check to see if a platform was specified
-        response = kandji_api(method="GET", endpoint="/v1/devices", params=params)
-
-        count += len(response)
-        offset += limit
-        if len(response) == 0:
-            break
+    # Loop over each app in the Kandji "apps" list and append to data dict
+    for app in device_apps["apps"]:
 
-        # breakout the response then append to the data list
-        for record in response:
-            data.append(record)
+        if args.name and args.name != app["app_name"]:
+            continue
 
-    if len(data) < 1:
-        print("No devices found...\n")
-        sys.exit()
+        data.append(
+            app_record(device, app["app_name"], app["bundle_id"], app["version"])
+        )
 
     return data
 
@@ -276,91 +218,71 @@ def generate_report_payload(devices, args):
     # list of apps
     data = []
 
-    # Loop over all Mac computers in Kandji
-    for device in devices:
+    # Look up the apps for several Mac computers at a time. Results come back in the
+    # same order as the device inventory.
+    for device_apps in fetch_each(
+        CLIENT,
+        devices,
+        "/v1/devices/{device_id}/apps",
+        lambda device, response: device_apps_records(device, response, args),
+        workers=args.workers,
+        use_async=args.use_async,
+        skipped=[],
+    ):
+        data.extend(device_apps)
 
-        device_apps = kandji_api(
-            method="GET", endpoint=f"/v1/devices/{device['device_id']}/apps"
-        )
+    return data
 
-        # Loop over each app in the Kandji "apps" list and append to data dict
-        for app in device_apps["apps"]:
-
-            if args.name:
-
-                if args.name == app["app_name"]:
-
-                    # Create a dictionary containing the application name, version, and
-                    # associated serial number.
-                    apps_dict = {
-                        "serial_number": device["serial_number"].upper(),
-                        "device_name": device["device_name"],
-                        "blueprint_name": device["blueprint_name"],
-                        "os_version": device["os_version"],
-                        "user": device["user"],
-                        "platform": device["platform"],
-                        "app_name": app["app_name"],
-                        "bundle_id": app["bundle_id"],
-                        "version": app["version"],
-                    }
-
-                    data.append(apps_dict)
-
-            else:
-                # Create a dictionary containing the application name, version, and
-                # associated serial number.
-                apps_dict = {
-                    "serial_number": device["serial_number"].upper(),
-                    "device_name": device["device_name"],
-                    "blueprint_name": device["blueprint_name"],
-                    "os_version": device["os_version"],
-                    "user": device["user"],
-                    "platform": device["platform"],
-                    "app_name": app["app_name"],
-                    "bundle_id": app["bundle_id"],
-                    "version": app["version"],
-                }
-
-                data.append(apps_dict)
 
-    return data
+def generate_prism_report_payload(devices, args):
+    """Create a JSON payload from the fleet-wide Prism apps collection.
 
+    Prism returns the apps on every device 300 at a time, so this takes one request per
+    page of apps instead of one request per device. Device details come from the
+    device inventory, joined on device_id. Apps on devices that are not in the
+    inventory are left out.
+    """
+    # Apps for each device, keyed by device_id in device inventory order
+    records = {device["device_id"]: [] for device in devices}
+    devices_by_id = {device["device_id"]: device for device in devices}
 
-def write_report(report_payload, report_name):
-    """Write app report."""
-    # write report to csv file
-    with open(report_name, mode="w", encoding="utf-8") as report:
+    for app in prism.stream_records(CLIENT, "apps"):
+        device = devices_by_id.get(app["device_id"])
 
-        out_fields = []
+        if device is None or (args.name and args.name != app["name"]):
+            continue
 
-        # automatically loop over keys in the payload to pullout header fields
-        for item in report_payload:
-            for key in item.keys():
-                if key not in out_fields:
-                    out_fields.append(key)
+        records[device["device_id"]].append(
+            app_record(device, app["name"], app["bundle_id"], app["version"])
+        )
 
-        writer = csv.DictWriter(report, fieldnames=out_fields)
+    # list of apps, in the same order as generate_report_payload
+    return [record for device_apps in records.values() for record in device_apps]
 
-        # Write headers to CSV
-        writer.writeheader()
 
-        # Loop over the app list sorted by app_name
+def write_report(report_payload, report_name):
+    """Write app report."""
+
+    def rows():
+        """Yield the apps sorted by app_name."""
         for app in sorted(report_payload, key=lambda k: k["app_name"]):
             # if a user is assinged
             if app["user"]:
                 # update user
                 app["user"] = app["user"]["name"]
-                # Write row to csv file
-                writer.writerow(app)
 
-            else:
-                writer.writerow(app)
+            yield app
+
+    # write report to csv file
+    report.write_report(rows(), report_name)
 
 
 def main():
     """Run main logic."""
     # Return the arguments
     arguments = program_arguments()
+    cli.apply_performance_arguments(CLIENT, arguments)
+    cli.apply_inventory_arguments(CLIENT, arguments)
 
     var_validation()
 
@@ -379,15 +301,33 @@ def main():
     else:
         report_name = f"apps_install_report_{TODAY}.csv"
 
+    # Use the file extension of the report format given with --format
+    report_name = report.report_path(report_name, arguments.report_format)
+
     # Get all device inventory records
     print("Getting device inventory from Kandji...")
-    device_inventory = get_devices(params=params_dict)
-
-    print(f"Total records returned: {len(device_inventory)}")
+    # Device records are streamed as each page of inventory arrives so that per-device
+    # requests start before the whole inventory has been downloaded.
+    # Only the fields this report reads are kept for each device.
+    device_inventory = inventory.stream_devices(
+        CLIENT, params=params_dict, fields=inventory.SUMMARY_FIELDS
+    )
     print("Looking for installed apps...")
 
     # create the report payload
-    report_payload = generate_report_payload(device_inventory, arguments)
+    if arguments.source == "prism":
+        # The whole inventory is needed to join device details to Prism records
+        report_payload = generate_prism_report_payload(
+            list(device_inventory), arguments
+        )
+    else:
+        report_payload = generate_report_payload(device_inventory, arguments)
+
+    if device_inventory.count < 1:
+        print("No devices found...\n")
+        sys.exit()
+
+    print(f"Total records returned: {device_inventory.count}")
 
     if len(report_payload) < 1:
         print(f"No devices found with {arguments.name} installed...")
@@ -0,0 +1,7 @@
+"""kandjilib
+Shared modules used by the api-tools scripts to interact with the Kandji API.
+"""
+
+# Github: github.com/kandji-inc/support
+
+__version__ = "0.1.0"
@@ -0,0 +1,111 @@
+"""adaptive.py
+Adjust the number of requests in flight based on API latency and throttling.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import math
+import threading
+
+# Number of requests in flight when a run starts
+DEFAULT_INITIAL_CONCURRENCY = 4
+
+# A window whose p95 latency is within this factor of the best p95 seen so far counts
+# as stable
+DEFAULT_LATENCY_TOLERANCE = 1.5
+
+# Status codes that mean the API wants us to slow down
+CONGESTION_STATUS_CODES = (429, 503)
+
+
+def percentile(values, percent):
+    """Return the value at the given percentile of a list of numbers."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(len(ordered) * percent / 100) - 1)
+
+    return ordered[index]
+
+
+class AdaptiveConcurrency:
+    """Additive increase, multiplicative decrease (AIMD) limit on requests in flight.
+
+    Latency is collected for one window of responses at a time, where a window is as
+    many responses as the current limit. If the p95 latency of a window stays close to
+    the best p95 seen so far the limit goes up by one. A 429 or 503 response halves the
+    limit. Responses to requests that were sent before a decrease are not counted
+    again, so one burst of throttling halves the limit once.
+
+    The object is also a gate for worker threads. Use it as a context manager around
+    each request and it holds a thread back while the limit is reached.
+    """
+
+    def __init__(
+        self,
+        maximum,
+        initial=DEFAULT_INITIAL_CONCURRENCY,
+        minimum=1,
+        tolerance=DEFAULT_LATENCY_TOLERANCE,
+        report=print,
+    ):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = max(minimum, min(initial, maximum))
+        self.tolerance = tolerance
+        self.report = report
+        self.baseline = None
+        self._latencies = []
+        self._since_decrease = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+        return self
+
+    def __exit__(self, *exc):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def record(self, latency, status_code):
+        """Record the latency and status code of a response and adjust the limit."""
+        with self._condition:
+            self._since_decrease += 1
+
+            if status_code in CONGESTION_STATUS_CODES:
+                if self._since_decrease >= self.limit:
+                    self._set_limit(
+                        max(self.minimum, self.limit // 2),
+                        f"received a {status_code} response",
+                    )
+                    self._since_decrease = 0
+                    self._latencies = []
+
+                return
+
+            self._latencies.append(latency)
+
+            if len(self._latencies) < self.limit:
+                return
+
+            p95 = percentile(self._latencies, 95)
+            self._latencies = []
+
+            if self.baseline is None or p95 < self.baseline:
+                self.baseline = p95
+
+            if p95 <= self.baseline * self.tolerance and self.limit < self.maximum:
+                self._set_limit(
+                    self.limit + 1, f"p95 latency steady at {p95 * 1000:.0f}ms"
+                )
+
+    def _set_limit(self, limit, reason):
+        """Change the limit, let waiting workers know, and report why."""
+        if limit != self.limit:
+            self.report(f"Concurrency {self.limit} -> {limit}: {reason}")
+            self.limit = limit
+            self._condition.notify_all()
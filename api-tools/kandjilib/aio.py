@@ -0,0 +1,332 @@
+"""aio.py
+asyncio counterpart to KandjiClient for running many requests on one event loop.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import asyncio
+import collections
+import contextlib
+import json
+import sys
+import time
+
+# aiohttp is only needed when a script is run with --async so it is imported lazily.
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Local libs
+from kandjilib import jsonskip
+from kandjilib.cache import response_key
+from kandjilib.client import (
+    DEFAULT_RATE_LIMIT_RETRIES,
+    DEFAULT_TIMEOUT,
+    http_errors,
+    is_error,
+)
+from kandjilib.ratelimit import TokenBucket, retry_after
+from kandjilib.retry import RETRY_STATUS_CODES, RetryPolicy
+
+# Maximum number of requests in flight across every endpoint
+DEFAULT_CONCURRENCY = 100
+
+# Maximum number of requests in flight to a single endpoint, for example
+# /v1/devices/{device_id}/details
+DEFAULT_ENDPOINT_CONCURRENCY = 50
+
+
+class ErrorResponse:
+    """Minimal stand-in for a requests.Response passed to the HTTP error handler."""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def __repr__(self):
+        return f"<Response [{self.status_code}]>"
+
+
+class AsyncKandjiClient:
+    """Kandji API client that runs requests as coroutines on a single event loop.
+
+    A global semaphore caps the number of requests in flight and a second semaphore per
+    endpoint keeps one slow endpoint from taking every slot. Requests are paced by the
+    same kind of token bucket as KandjiClient and wait out 429 responses together, and
+    GET requests are retried after transient errors under the same retry policy.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        headers,
+        concurrency=DEFAULT_CONCURRENCY,
+        endpoint_concurrency=DEFAULT_ENDPOINT_CONCURRENCY,
+        timeout=DEFAULT_TIMEOUT,
+        error_handler=http_errors,
+        rate_limiter=None,
+        rate_limit_retries=DEFAULT_RATE_LIMIT_RETRIES,
+        adaptive=None,
+        retry_policy=None,
+    ):
+        if aiohttp is None:
+            sys.exit(
+                "Looks like you need to install the aiohttp module to use --async. Open "
+                "a Terminal and run python3 -m pip install aiohttp."
+            )
+
+        self.base_url = base_url
+        self.headers = headers
+        self.concurrency = concurrency
+        self.endpoint_concurrency = min(endpoint_concurrency, concurrency)
+        self.timeout = timeout
+        self.error_handler = error_handler
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.rate_limit_retries = rate_limit_retries
+        self.adaptive = adaptive
+        self.retry_policy = retry_policy or RetryPolicy()
+        # The session and semaphores are created on first use so that they are bound to
+        # the event loop that runs the requests.
+        self._session = None
+        self._semaphore = None
+        self._endpoint_semaphores = {}
+        self._slots = None
+        self._in_flight = 0
+
+    def _endpoint_semaphore(self, endpoint):
+        """Return the semaphore for an endpoint."""
+        if endpoint not in self._endpoint_semaphores:
+            self._endpoint_semaphores[endpoint] = asyncio.Semaphore(
+                self.endpoint_concurrency
+            )
+
+        return self._endpoint_semaphores[endpoint]
+
+    @contextlib.asynccontextmanager
+    async def _adaptive_slot(self):
+        """Wait until the adaptive concurrency limit allows another request."""
+        if self.adaptive is None:
+            yield
+            return
+
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._in_flight < self.adaptive.limit)
+            self._in_flight += 1
+
+        try:
+            yield
+        finally:
+            async with self._slots:
+                self._in_flight -= 1
+                self._slots.notify_all()
+
+    async def _send(self, method, endpoint, params=None, payload=None):
+        """Send a request and return its status code, reason, and body.
+
+        Retries follow the same rules as KandjiClient.send().
+        """
+        rate_limited = 0
+        retries = 0
+        self.retry_policy.budget.deposit()
+
+        while True:
+            await asyncio.sleep(self.rate_limiter.reserve())
+            started = time.monotonic()
+
+            try:
+                async with self._session.request(
+                    method, self.base_url + endpoint, data=payload, params=params
+                ) as response:
+                    text = await response.text()
+                    status_code = response.status
+                    reason = response.reason
+                    header = response.headers.get("Retry-After")
+
+            except asyncio.TimeoutError:
+                delay = self.retry_policy.delay(method, retries)
+
+                if delay is None:
+                    raise
+
+                retries += 1
+                await asyncio.sleep(delay)
+                continue
+
+            if self.adaptive is not None:
+                self.adaptive.record(time.monotonic() - started, status_code)
+
+            if status_code == 429 and rate_limited < self.rate_limit_retries:
+                delay = retry_after(header, rate_limited)
+                rate_limited += 1
+
+                if self.rate_limiter.pause(delay):
+                    print(
+                        f"Reached the Kandji API rate limit. Waiting {delay:g} seconds "
+                        "before sending more requests..."
+                    )
+
+                continue
+
+            if status_code in RETRY_STATUS_CODES:
+                delay = self.retry_policy.delay(method, retries)
+
+                if delay is not None:
+                    retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+            return status_code, reason, text
+
+    async def kandji_api(
+        self, method, endpoint, params=None, payload=None, route=None, decode=None
+    ):
+        """Make an API request and return data.
+
+        method   - an HTTP Method (GET, POST, PATCH, DELETE).
+        endpoint - the API URL endpoint to target.
+        params   - optional parameters can be passed as a dict.
+        payload  - optional payload is passed as a dict and used with PATCH and POST
+                   methods.
+        route    - name used for the per-endpoint concurrency cap. Defaults to the
+                   endpoint.
+        decode   - optional function called with the body of a successful response to
+                   return its data, in place of json.loads.
+        Returns a JSON data object.
+        """
+        if self._session is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._slots = asyncio.Condition()
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+            )
+
+        endpoint_semaphore = self._endpoint_semaphore(route or endpoint)
+
+        async with self._semaphore, endpoint_semaphore, self._adaptive_slot():
+            try:
+                status_code, reason, text = await self._send(
+                    method, endpoint, params=params, payload=payload
+                )
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                self.error_handler(resp=None, resp_code=None, err_msg=err)
+                return {"error": "None", "api resp": f"{err}"}
+
+        # If a successful status code is returned (200 and 300 range)
+        if status_code < 400:
+            try:
+                return (decode or json.loads)(text)
+            except ValueError:
+                return text
+
+        kind = "Client" if status_code < 500 else "Server"
+        err = f"{status_code} {kind} Error: {reason} for url: {self.base_url}{endpoint}"
+        self.error_handler(
+            resp=ErrorResponse(status_code, text), resp_code=status_code, err_msg=err
+        )
+
+        return {"error": f"{status_code}", "api resp": f"{err}"}
+
+    async def close(self):
+        """Close every pooled connection."""
+        if self._session is not None:
+            await self._session.close()
+
+
+def fetch_each(
+    client, items, endpoint, transform, concurrency=None, skipped=None, skip=None
+):
+    """GET an endpoint for every item on an event loop and yield transformed results.
+
+    client      - the KandjiClient whose base URL, headers, and error handler are
+                  used.
+    items       - any iterable of dicts, including a generator. Items are read
+                  lazily.
+    endpoint    - endpoint template formatted with each item, for example
+                  "/v1/devices/{device_id}/apps".
+    transform   - called with the item and the API response. Its return value is
+                  yielded.
+    concurrency - number of requests allowed in flight at the same time. Defaults
+                  to DEFAULT_CONCURRENCY.
+    skipped     - yielded instead of calling transform when a request fails.
+    skip        - dotted key paths left out of each response while it is decoded.
+
+    Results are yielded in the same order as items. Responses are reused from the
+    client's ResponseCache in the same way as kandjilib.fanout.fetch_each().
+    """
+    concurrency = concurrency or DEFAULT_CONCURRENCY
+    aio_client = AsyncKandjiClient(
+        base_url=client.base_url,
+        headers=client.headers,
+        concurrency=concurrency,
+        # Every request goes to the one endpoint, so it gets every slot. Otherwise
+        # DEFAULT_ENDPOINT_CONCURRENCY would cap the whole run.
+        endpoint_concurrency=concurrency,
+        timeout=client.timeout,
+        error_handler=client.error_handler,
+        rate_limiter=client.rate_limiter,
+        rate_limit_retries=client.rate_limit_retries,
+        adaptive=client.adaptive,
+        retry_policy=client.retry_policy,
+    )
+
+    cache = client.cache
+
+    async def fetch(item):
+        """Return the transformed response for a single item."""
+        path = endpoint.format(**item)
+        key = response_key(client.base_url, path, skip)
+        version = item.get("last_check_in") if cache is not None else None
+
+        if version:
+            response = cache.get(key, version)
+
+            if response is not None:
+                return transform(item, response)
+
+        response = await aio_client.kandji_api(
+            method="GET",
+            endpoint=path,
+            route=endpoint,
+            decode=(lambda text: jsonskip.loads(text, skip)) if skip else None,
+        )
+
+        if is_error(response):
+            return skipped
+
+        if version:
+            cache.put(key, version, response)
+
+        return transform(item, response)
+
+    # Keep enough requests queued to fill every slot without reading every item up
+    # front.
+    window = aio_client.concurrency * 2
+    pending = collections.deque()
+    loop = asyncio.new_event_loop()
+
+    try:
+        for item in items:
+            pending.append(loop.create_task(fetch(item)))
+
+            if len(pending) >= window:
+                # The loop keeps running every other pending request while we wait on
+                # the oldest one.
+                yield loop.run_until_complete(pending.popleft())
+
+        while pending:
+            yield loop.run_until_complete(pending.popleft())
+
+    finally:
+        for task in pending:
+            task.cancel()
+
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+        loop.run_until_complete(aio_client.close())
+        loop.close()
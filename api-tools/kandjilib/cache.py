@@ -0,0 +1,176 @@
+"""cache.py
+On-disk cache of per-device API responses.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+
+# Default location of the cache database
+DEFAULT_CACHE_PATH = pathlib.Path.home() / ".kandjilib" / "response_cache.sqlite3"
+
+# Hours a cached response is used before it is downloaded again even if the device has
+# not checked in
+DEFAULT_CACHE_TTL = 24 * 7
+
+# Number of changes written before they are committed to disk
+COMMIT_EVERY = 100
+
+# Size of the cached responses in bytes above which the least recently used responses
+# are removed
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+# Share of the size limit the cache is brought down to when it goes over, so that a run
+# that keeps adding responses does not remove them again on every write
+EVICT_TO = 0.9
+
+
+def response_key(base_url, path, skip=None):
+    """Return the key a response is stored under.
+
+    Responses decoded without some of their keys are stored apart from full ones.
+    """
+    if skip:
+        return f"{base_url}{path}#skip={','.join(sorted(skip))}"
+
+    return base_url + path
+
+
+class ResponseCache:
+    """SQLite cache of API responses for individual devices.
+
+    Each response is stored with a version, which is the device's last_check_in from
+    /v1/devices. A device that has checked in since its response was stored has a new
+    version, so the stale response is ignored and replaced. Responses older than the
+    TTL are ignored as well. The size of the stored responses is tracked as they are
+    added, and as soon as it passes the size limit the least recently used responses
+    are removed, during a run as well as when the cache is opened.
+
+    One connection is shared by every worker thread and guarded by a lock. Lookups are
+    fast compared to an API request so this is not a bottleneck.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_CACHE_PATH,
+        ttl=DEFAULT_CACHE_TTL,
+        max_size=DEFAULT_CACHE_SIZE,
+    ):
+        self.path = pathlib.Path(path).expanduser()
+        self.ttl = ttl * 3600
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        # Size of the stored responses in bytes. Replaced responses are counted twice
+        # until the next eviction, which adds up the real size.
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, version TEXT, stored_at REAL, used_at REAL, "
+            "size INTEGER, body TEXT)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)"
+        )
+        self.evict()
+
+    def get(self, key, version):
+        """Return the cached response for key, or None if there is no usable one."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, stored_at, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or row[0] != version or row[1] < time.time() - self.ttl:
+                self.misses += 1
+                return None
+
+            self._db.execute(
+                "UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._changed()
+            self.hits += 1
+
+        return json.loads(row[2])
+
+    def put(self, key, version, data):
+        """Store a response."""
+        body = json.dumps(data)
+        now = time.time()
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, version, now, now, len(body), body),
+            )
+            self._size += len(body)
+            self._changed()
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def _changed(self):
+        """Commit once enough changes have been made. Call with the lock held."""
+        self._pending += 1
+
+        if self._pending >= COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def flush(self):
+        """Commit every change made so far."""
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def evict(self):
+        """Remove expired responses, then the least recently used until under size."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        """Remove expired and least recently used responses. Call with the lock held."""
+        self._db.execute(
+            "DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl,)
+        )
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+        if total > self.max_size:
+            target = self.max_size * EVICT_TO
+            rows = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY used_at"
+            ).fetchall()
+            evicted = []
+
+            for key, size in rows:
+                if total <= target:
+                    break
+
+                evicted.append((key,))
+                total -= size
+
+            self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+        self._size = total
+        self._db.commit()
+        self._pending = 0
+
+    def close(self):
+        """Commit any remaining changes and close the database."""
+        with self._lock:
+            self._db.commit()
+            self._db.close()
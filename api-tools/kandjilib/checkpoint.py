@@ -0,0 +1,104 @@
+"""checkpoint.py
+Save per-device results to disk as a run goes so that a failed run can be resumed.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import json
+import pathlib
+import sqlite3
+import threading
+
+# Folder the checkpoint journal of each script is kept in
+DEFAULT_CHECKPOINT_DIR = pathlib.Path.home() / ".kandjilib" / "checkpoints"
+
+# Number of results written before they are committed to disk. A run that is killed
+# outright loses at most this many results.
+COMMIT_EVERY = 50
+
+
+class CheckpointJournal:
+    """SQLite journal of the per-device responses received during a run.
+
+    Every response is written as it arrives under the request it answers, which names
+    the device, along with the device's last_check_in. If the run stops before it
+    finishes, the next run with resume=True reads the saved responses instead of
+    requesting those devices again. With refetch_updated, devices that have checked in
+    since their response was saved are requested again. A run without resume starts a
+    new journal, and the journal file is deleted once a run finishes.
+    """
+
+    def __init__(self, path, resume=False, refetch_updated=False):
+        self.path = pathlib.Path(path).expanduser()
+        self.refetch_updated = refetch_updated
+        self.hits = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, version TEXT, body TEXT)"
+        )
+
+        if not resume:
+            self._db.execute("DELETE FROM results")
+
+        self._db.commit()
+        self.saved = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, key, version=None):
+        """Return the saved response for key, or None if there is no usable one."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, body FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            if self.refetch_updated and row[0] != (version or ""):
+                return None
+
+            self.hits += 1
+
+        return json.loads(row[1])
+
+    def put(self, key, version, data):
+        """Save a response."""
+        body = json.dumps(data)
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                (key, version or "", body),
+            )
+            self._pending += 1
+
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+
+    def flush(self):
+        """Commit every result saved so far."""
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def remove(self):
+        """Close the journal and delete its files once a run has finished."""
+        with self._lock:
+            self._db.close()
+
+            for suffix in ("", "-wal", "-shm"):
+                pathlib.Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+    def close(self):
+        """Commit any remaining results and close the database."""
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,242 @@
+"""cli.py
+Command line options shared by the api-tools scripts.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import pathlib
+import sys
+
+# Local libs
+from kandjilib.adaptive import AdaptiveConcurrency
+from kandjilib.aio import DEFAULT_CONCURRENCY
+from kandjilib.cache import DEFAULT_CACHE_PATH, DEFAULT_CACHE_TTL, ResponseCache
+from kandjilib.checkpoint import DEFAULT_CHECKPOINT_DIR, CheckpointJournal
+from kandjilib.client import DEFAULT_POOL_SIZE
+from kandjilib.fanout import DEFAULT_WORKERS
+from kandjilib.filters import parse_filter
+from kandjilib.inventory import DEFAULT_INVENTORY_PATH, InventorySnapshot
+from kandjilib.ratelimit import DEFAULT_RATE_LIMIT
+from kandjilib.report import DEFAULT_FORMAT, FORMATS, check_format
+
+
+def add_performance_arguments(parser):
+    """Add options that control how per-device API requests are made."""
+    group = parser.add_argument_group(
+        title="Performance options",
+        description="Options that control how requests are sent to the Kandji API.",
+    )
+
+    group.add_argument(
+        "--workers",
+        type=int,
+        metavar=f"{DEFAULT_WORKERS}",
+        help="Number of per-device API requests to run at the same time. Defaults to "
+        f"{DEFAULT_WORKERS}, or {DEFAULT_CONCURRENCY} with --async. Use 1 to send "
+        "requests one at a time.",
+        required=False,
+    )
+
+    group.add_argument(
+        "--async",
+        action="store_true",
+        dest="use_async",
+        help="Send per-device API requests from a single asyncio event loop instead "
+        "of worker threads. Requires the aiohttp module.",
+        required=False,
+    )
+
+    group.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Adjust the number of requests in flight while the script runs. It grows "
+        "by one while response times stay steady and is cut in half when the API "
+        "responds with 429 or 503. --workers sets the upper bound, which defaults to "
+        f"{DEFAULT_POOL_SIZE}, or {DEFAULT_CONCURRENCY} with --async.",
+        required=False,
+    )
+
+    group.add_argument(
+        "--rate-limit",
+        type=float,
+        metavar="[requests per second]",
+        help="Pace requests to the Kandji API. By default requests are paced to the "
+        f"API limit of {DEFAULT_RATE_LIMIT:,} requests per hour. Responses with a 429 "
+        "status always pause requests for the time given by the API.",
+        required=False,
+    )
+
+    group.add_argument(
+        "--cache",
+        nargs="?",
+        const=str(DEFAULT_CACHE_PATH),
+        metavar="path",
+        help="Keep per-device API responses in a local SQLite database and reuse them "
+        "until the device checks in again. The database is stored at "
+        f"{DEFAULT_CACHE_PATH} unless a path is given.",
+        required=False,
+    )
+
+    group.add_argument(
+        "--cache-ttl",
+        type=float,
+        metavar=f"{DEFAULT_CACHE_TTL}",
+        help="Hours a cached response is reused for before it is downloaded again. "
+        f"Defaults to {DEFAULT_CACHE_TTL}.",
+        required=False,
+    )
+
+    return group
+
+
+def apply_performance_arguments(client, arguments):
+    """Configure a KandjiClient from the performance options."""
+    if arguments.rate_limit:
+        client.set_rate_limit(arguments.rate_limit)
+
+    if arguments.adaptive:
+        maximum = arguments.workers or (
+            DEFAULT_CONCURRENCY if arguments.use_async else DEFAULT_POOL_SIZE
+        )
+        client.adaptive = AdaptiveConcurrency(maximum=maximum)
+
+    if arguments.cache:
+        client.cache = ResponseCache(
+            path=arguments.cache, ttl=arguments.cache_ttl or DEFAULT_CACHE_TTL
+        )
+
+
+def add_inventory_arguments(parser):
+    """Add options that control where device inventory is read from."""
+    group = parser.add_argument_group(
+        title="Inventory options",
+        description="Options that control where device inventory is read from.",
+    )
+
+    group.add_argument(
+        "--inventory",
+        nargs="?",
+        const=str(DEFAULT_INVENTORY_PATH),
+        metavar="path",
+        help="Read devices from a local inventory snapshot instead of paging through "
+        "every device in Kandji. Only devices that changed since the last run are "
+        f"downloaded. The snapshot is stored at {DEFAULT_INVENTORY_PATH} unless a "
+        "path is given.",
+        required=False,
+    )
+
+    group.add_argument(
+        "--full-sync",
+        action="store_true",
+        help="Read every device into the inventory snapshot before running. Removed "
+        "devices are also dropped from the snapshot. A full sync runs once a day on "
+        "its own.",
+        required=False,
+    )
+
+    return group
+
+
+def apply_inventory_arguments(client, arguments):
+    """Configure a KandjiClient from the inventory options."""
+    if arguments.inventory:
+        client.inventory = InventorySnapshot(
+            path=arguments.inventory, force_full_sync=arguments.full_sync
+        )
+
+
+def add_checkpoint_arguments(parser):
+    """Add options that control how a long run is resumed."""
+    group = parser.add_argument_group(
+        title="Checkpoint options",
+        description="Per-device results are saved to a journal in "
+        f"{DEFAULT_CHECKPOINT_DIR} as they arrive so that a run that stops early can "
+        "pick up where it left off. The journal is deleted once a run finishes.",
+    )
+
+    group.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume the last run of this script that did not finish. Devices whose "
+        "results were saved are not requested again.",
+        required=False,
+    )
+
+    group.add_argument(
+        "--refetch-updated",
+        action="store_true",
+        help="With --resume, request the devices that checked in since their results "
+        "were saved again so that the report has their latest data.",
+        required=False,
+    )
+
+    return group
+
+
+def apply_checkpoint_arguments(client, arguments):
+    """Configure a KandjiClient with the checkpoint journal for this script."""
+    client.journal = CheckpointJournal(
+        path=DEFAULT_CHECKPOINT_DIR / f"{pathlib.Path(sys.argv[0]).stem}.sqlite3",
+        resume=arguments.resume,
+        refetch_updated=arguments.refetch_updated,
+    )
+
+    if arguments.resume:
+        print(f"Resuming with {client.journal.saved} saved results...")
+
+
+def add_report_arguments(parser):
+    """Add options that control how the report is written."""
+    group = parser.add_argument_group(
+        title="Report options",
+        description="Options that control how the report is written.",
+    )
+
+    group.add_argument(
+        "--format",
+        type=check_format,
+        choices=FORMATS,
+        dest="report_format",
+        metavar=f"[{'|'.join(FORMATS)}]",
+        help=f"File format of the report. Defaults to {DEFAULT_FORMAT}. Parquet reports "
+        "are much smaller than CSV reports with many columns and load quickly into "
+        "analytics tools. Requires the pyarrow module.",
+        required=False,
+    )
+
+    return group
+
+
+def add_filter_arguments(parser, example="os_version^=14.", separator="."):
+    """Add the --filter option for filtering report records on dotted key paths.
+
+    separator is the separator of the report's column names, if it is not a dot, so
+    that the report's columns can be filtered on as well.
+    """
+    description = (
+        "Only include records that match every --filter. Paths are the dotted keys of "
+        "each API record, for example user.email"
+    )
+
+    if separator != ".":
+        description += f", or the report's column names, like user{separator}email"
+
+    group = parser.add_argument_group(
+        title="Filter options", description=f"{description}."
+    )
+
+    group.add_argument(
+        "--filter",
+        action="append",
+        type=parse_filter,
+        metavar=f'"{example}"',
+        help="Add a filter. Use path=value to match a value without regard to case, "
+        "path^=value to match the start of a value, path>=value, path>value, "
+        "path<=value, or path<value to match a range, path to match a true value, "
+        "and !path to match a false value. Ranges compare the numbers in versions "
+        "and dates by value. Can be given more than once.",
+        required=False,
+    )
+
+    return group
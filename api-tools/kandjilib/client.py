@@ -0,0 +1,276 @@
+"""client.py
+Shared Kandji API client with a long-lived, thread-safe connection pool.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import sys
+import threading
+import time
+
+# Try to import the module. If the module cannot be imported let the user know so that
+# they can install it.
+try:
+    import requests
+except ImportError as import_error:
+    print(import_error)
+    sys.exit(
+        "Looks like you need to install the requests module. Open a Terminal and run  "
+        "python3 -m pip install requests."
+    )
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+# Local libs
+from kandjilib.ratelimit import TokenBucket, retry_after
+from kandjilib.retry import RETRY_STATUS_CODES, RetryPolicy
+
+# Maximum number of connections kept open to the Kandji API. Connections are only
+# opened when they are needed so a large pool does not cost anything up front.
+DEFAULT_POOL_SIZE = 64
+
+# Seconds to wait for the API before giving up on a request
+DEFAULT_TIMEOUT = 30
+
+# Number of times a request is sent again after a 429 response before the error handler
+# is called
+DEFAULT_RATE_LIMIT_RETRIES = 10
+
+
+def http_errors(resp, resp_code, err_msg):
+    """Handle HTTP errors."""
+    # 400
+    if resp_code == requests.codes["bad_request"]:
+        print(f"\n\t{err_msg}")
+        print(f"\tResponse msg: {resp.text}\n")
+    # 401
+    elif resp_code == requests.codes["unauthorized"]:
+        print("Make sure that you have the required permissions to access this data.")
+        print(
+            "Depending on the API platform this could mean that access has just been "
+            "blocked."
+        )
+        sys.exit(f"\t{err_msg}")
+    # 403
+    elif resp_code == requests.codes["forbidden"]:
+        print("The api key may be invalid or missing.")
+        sys.exit(f"\t{err_msg}")
+    # 404
+    elif resp_code == requests.codes["not_found"]:
+        print("\nWe cannot find the one that you are looking for...")
+        print("Move along...")
+        print(f"\tError: {err_msg}")
+        print(f"\tResponse msg: {resp}")
+        print(
+            "\tPossible reason: If this is a device, it could be because the device is "
+            "no longer\n"
+            "\t\t\t enrolled in Kandji. This would prevent the MDM command from being\n"
+            "\t\t\t sent successfully.\n"
+        )
+    # 429
+    elif resp_code == requests.codes["too_many_requests"]:
+        print("You have reached the rate limit and it has not reset after waiting...")
+        print("Try again later ...")
+        sys.exit(f"\t{err_msg}")
+    # 500
+    elif resp_code == requests.codes["internal_server_error"]:
+        print("The service is having a problem...")
+        sys.exit(err_msg)
+    # 502, 503, 504
+    elif resp_code in (
+        requests.codes["bad_gateway"],
+        requests.codes["service_unavailable"],
+        requests.codes["gateway_timeout"],
+    ):
+        print("Unable to reach the service. Try again later...")
+    else:
+        print("Something really bad must have happened...")
+        print(err_msg)
+        sys.exit()
+
+
+def is_error(data):
+    """Return True if data is the error dict returned by kandji_api()."""
+    return isinstance(data, dict) and set(data) == {"error", "api resp"}
+
+
+class KandjiClient:
+    """Kandji API client shared by every request a tool makes.
+
+    All requests go through a single HTTPAdapter, which owns the urllib3 connection
+    pool, so TCP and TLS connections are reused across requests instead of being set
+    up for every call. Each thread gets its own requests.Session mounted on that
+    adapter because a Session is not safe to share between threads, while the
+    connection pool underneath is.
+
+    Requests are paced by a token bucket shared by every thread. When the API answers
+    with 429 the bucket is paused for the time given in the Retry-After header, which
+    slows every worker down together, and the request is sent again. GET requests that
+    hit a transient server error or a timeout are retried with jittered exponential
+    backoff until the run-wide retry budget is spent.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        headers,
+        pool_size=DEFAULT_POOL_SIZE,
+        max_retries=3,
+        timeout=DEFAULT_TIMEOUT,
+        error_handler=http_errors,
+        rate_limiter=None,
+        rate_limit_retries=DEFAULT_RATE_LIMIT_RETRIES,
+        adaptive=None,
+        retry_policy=None,
+        cache=None,
+        inventory=None,
+        journal=None,
+    ):
+        self.base_url = base_url
+        self.headers = headers
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.error_handler = error_handler
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.rate_limit_retries = rate_limit_retries
+        # Optional AdaptiveConcurrency that is told the latency and status code of
+        # every response
+        self.adaptive = adaptive
+        # Shared by every thread so that the retry budget covers the whole run
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Optional ResponseCache used by kandjilib.fanout.fetch_each()
+        self.cache = cache
+        # Optional InventorySnapshot used by kandjilib.inventory.get_devices()
+        self.inventory = inventory
+        # Optional CheckpointJournal used by kandjilib.fanout.fetch_each()
+        self.journal = journal
+        if isinstance(max_retries, int):
+            # 429 responses are handled by send() so that every thread waits on the
+            # shared rate limiter instead of each connection sleeping on its own.
+            max_retries = Retry(
+                total=max_retries, read=False, respect_retry_after_header=False
+            )
+
+        self._adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=max_retries
+        )
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """Return the requests session for the calling thread."""
+        session = getattr(self._local, "session", None)
+
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount(self.base_url, self._adapter)
+            self._local.session = session
+
+        return session
+
+    def kandji_api(self, method, endpoint, params=None, payload=None, decode=None):
+        """Make an API request and return data.
+
+        method   - an HTTP Method (GET, POST, PATCH, DELETE).
+        endpoint - the API URL endpoint to target.
+        params   - optional parameters can be passed as a dict.
+        payload  - optional payload is passed as a dict and used with PATCH and POST
+                   methods.
+        decode   - optional function called with a successful response to return its
+                   data, in place of decoding the body as JSON.
+        Returns a JSON data object.
+        """
+        response = None
+
+        try:
+            response = self.send(method, endpoint, params=params, payload=payload)
+
+            # If a successful status code is returned (200 and 300 range)
+            if response:
+                try:
+                    data = (decode or requests.Response.json)(response)
+                except Exception:
+                    data = response.text
+
+            # if the request is successful exceptions will not be raised
+            response.raise_for_status()
+
+        except requests.exceptions.RequestException as err:
+            status_code = getattr(response, "status_code", None)
+            self.error_handler(resp=response, resp_code=status_code, err_msg=err)
+            data = {"error": f"{status_code}", "api resp": f"{err}"}
+
+        return data
+
+    def set_rate_limit(self, rate):
+        """Pace requests to a number of requests per second."""
+        self.rate_limiter = TokenBucket(rate=rate)
+
+    def send(self, method, endpoint, params=None, payload=None):
+        """Send a request and return the response.
+
+        The request waits for the rate limiter and is sent again after a 429. GET
+        requests are also retried after a 502, 503, 504, or timeout while the retry
+        policy allows it.
+        """
+        rate_limited = 0
+        retries = 0
+        self.retry_policy.budget.deposit()
+
+        while True:
+            self.rate_limiter.wait()
+            started = time.monotonic()
+
+            try:
+                response = self.session.request(
+                    method,
+                    self.base_url + endpoint,
+                    data=payload,
+                    params=params,
+                    timeout=self.timeout,
+                )
+
+            except requests.exceptions.Timeout:
+                delay = self.retry_policy.delay(method, retries)
+
+                if delay is None:
+                    raise
+
+                retries += 1
+                time.sleep(delay)
+                continue
+
+            if self.adaptive is not None:
+                self.adaptive.record(time.monotonic() - started, response.status_code)
+
+            if (
+                response.status_code == requests.codes["too_many_requests"]
+                and rate_limited < self.rate_limit_retries
+            ):
+                delay = retry_after(response.headers.get("Retry-After"), rate_limited)
+                rate_limited += 1
+
+                if self.rate_limiter.pause(delay):
+                    print(
+                        f"Reached the Kandji API rate limit. Waiting {delay:g} seconds "
+                        "before sending more requests..."
+                    )
+
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                delay = self.retry_policy.delay(method, retries)
+
+                if delay is not None:
+                    retries += 1
+                    time.sleep(delay)
+                    continue
+
+            return response
+
+    def close(self):
+        """Close every pooled connection."""
+        self._adapter.close()
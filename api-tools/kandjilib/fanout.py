@@ -0,0 +1,215 @@
+"""fanout.py
+Run per-device API requests concurrently while keeping results in device order.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import collections
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Local libs
+from kandjilib import aio, jsonskip
+from kandjilib.cache import response_key
+from kandjilib.client import is_error
+
+# Default number of worker threads used to fan out per-device requests. Reports are
+# bound by API latency rather than CPU so this can be raised on large tenants.
+DEFAULT_WORKERS = 8
+
+# Stands in for the result of an item that is requested rather than read back from a
+# checkpoint journal
+_REQUESTED = object()
+
+
+def fan_out(items, func, workers=DEFAULT_WORKERS):
+    """Call func on every item using a pool of worker threads.
+
+    items   - any iterable, including a generator. Items are read lazily.
+    func    - called once per item. Its return value is yielded.
+    workers - number of requests allowed to run at the same time.
+
+    Results are yielded in the same order as items no matter which request finishes
+    first. Only a small window of items is submitted ahead of the results being
+    consumed so memory use does not grow with the number of devices.
+    """
+    workers = max(1, int(workers or DEFAULT_WORKERS))
+    window = workers * 2
+    pending = collections.deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+        finally:
+            # Do not start any queued work if we are exiting early. This happens when
+            # a worker calls sys.exit() or the caller stops reading results.
+            for future in pending:
+                future.cancel()
+
+
+def fetch_each(
+    client,
+    items,
+    endpoint,
+    transform,
+    workers=None,
+    use_async=False,
+    skipped=None,
+    skip=None,
+):
+    """GET an endpoint for every item and yield transformed results in item order.
+
+    client    - the KandjiClient used to make the requests.
+    items     - any iterable of dicts, including a generator. Items are read lazily.
+    endpoint  - endpoint template formatted with each item, for example
+                "/v1/devices/{device_id}/apps".
+    transform - called with the item and the API response. Its return value is
+                yielded.
+    workers   - number of requests allowed to run at the same time.
+    use_async - run the requests as coroutines on a single event loop instead of on
+                worker threads. This scales to hundreds of requests in flight.
+    skipped   - yielded instead of calling transform when a request fails. The error
+                has already been reported by the client's error handler.
+    skip      - dotted key paths left out of each response while it is decoded, for
+                example ["volumes", "users.system_users"]. See kandjilib.jsonskip.
+
+    If the client has an AdaptiveConcurrency, it decides how many requests are in
+    flight at any moment and workers is ignored in favor of its maximum.
+
+    If the client has a ResponseCache, responses are stored under the item's
+    last_check_in and reused until the device checks in again. Items without a
+    last_check_in are never cached.
+
+    If the client has a CheckpointJournal, every response is saved to it as it
+    arrives. Items whose response was saved by an earlier run that did not finish are
+    not requested again, and the journal is deleted once every result is yielded.
+    """
+    adaptive = client.adaptive
+    cache = client.cache
+    journal = client.journal
+
+    # Results read back from the journal in item order, with _REQUESTED in place of
+    # each item that is requested
+    resumed = collections.deque()
+
+    if journal is not None:
+        items, transform = _journaled(
+            client, journal, items, endpoint, transform, resumed, skip
+        )
+
+    if adaptive is not None:
+        workers = adaptive.maximum
+
+    if use_async:
+        results = aio.fetch_each(
+            client,
+            items,
+            endpoint,
+            transform,
+            concurrency=workers,
+            skipped=skipped,
+            skip=skip,
+        )
+
+    else:
+
+        def fetch(item):
+            """Return the transformed response for a single item."""
+            path = endpoint.format(**item)
+            key = response_key(client.base_url, path, skip)
+            version = item.get("last_check_in") if cache is not None else None
+
+            if version:
+                response = cache.get(key, version)
+
+                if response is not None:
+                    return transform(item, response)
+
+            with adaptive or contextlib.nullcontext():
+                response = client.kandji_api(
+                    method="GET",
+                    endpoint=path,
+                    decode=(lambda r: jsonskip.loads(r.text, skip)) if skip else None,
+                )
+
+            if is_error(response):
+                return skipped
+
+            if version:
+                cache.put(key, version, response)
+
+            return transform(item, response)
+
+        results = fan_out(items, fetch, workers=workers)
+
+    if journal is None:
+        yield from results
+
+    else:
+        try:
+            for result in results:
+                # Yield the results read back from the journal ahead of this one
+                while resumed[0] is not _REQUESTED:
+                    yield resumed.popleft()
+
+                resumed.popleft()
+                yield result
+
+            yield from resumed
+
+        finally:
+            journal.flush()
+
+        journal.remove()
+
+        if journal.hits:
+            print(f"Checkpoint: {journal.hits} results resumed from the last run")
+
+    if cache is not None:
+        cache.flush()
+        print(f"Response cache: {cache.hits} reused, {cache.misses} downloaded")
+
+
+def _journaled(client, journal, items, endpoint, transform, resumed, skip):
+    """Return the items still to request and a transform that saves each response.
+
+    Items that already have a response in the journal are transformed right away and
+    their results are added to resumed. Every other item adds _REQUESTED to resumed so
+    that results can be put back in item order.
+    """
+
+    def unfinished():
+        """Yield the items that do not have a response in the journal."""
+        for item in items:
+            response = journal.get(
+                response_key(client.base_url, endpoint.format(**item), skip),
+                item.get("last_check_in"),
+            )
+
+            if response is None:
+                resumed.append(_REQUESTED)
+                yield item
+
+            else:
+                resumed.append(transform(item, response))
+
+    def recorded(item, response):
+        """Save the response to the journal and return the transformed result."""
+        journal.put(
+            response_key(client.base_url, endpoint.format(**item), skip),
+            item.get("last_check_in"),
+            response,
+        )
+
+        return transform(item, response)
+
+    return unfinished(), recorded
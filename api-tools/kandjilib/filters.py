@@ -0,0 +1,322 @@
+"""filters.py
+Match nested API responses against filters on dotted key paths without flattening them.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import abc
+import argparse
+import functools
+import re
+
+# Returned by lookup() when a record has no value at a path
+MISSING = object()
+
+# Strings read as true or false by Boolean. The API returns some flags as strings, for
+# example "agent_installed": "True".
+TRUE_STRINGS = ("true", "yes", "on", "1")
+FALSE_STRINGS = ("false", "no", "off", "0", "")
+
+# A --filter expression, for example os_version^=14. or last_check_in>=2026-01-01
+FILTER_EXPRESSION = re.compile(
+    r"^\s*(?P<path>[^=<>^!\s]+)\s*(?P<operator>\^=|>=|<=|=|>|<)\s*(?P<value>.*?)\s*$"
+)
+
+
+class Predicate(abc.ABC):
+    """Base class of the tests that can be given for a path in compile_filter().
+
+    A predicate is called with the value at its path and returns True if the value
+    passes the test. It is never called for records that have no value at the path.
+    """
+
+    @abc.abstractmethod
+    def __call__(self, value):
+        """Return True if value passes the test."""
+
+
+class Equals(Predicate):
+    """Test that a value equals expected.
+
+    With ignore_case the value and expected are compared as lowercase strings, so
+    Equals("true", ignore_case=True) matches both True and "True".
+    """
+
+    def __init__(self, expected, ignore_case=False):
+        self.ignore_case = ignore_case
+        self.expected = str(expected).lower() if ignore_case else expected
+
+    def __call__(self, value):
+        if self.ignore_case:
+            return str(value).lower() == self.expected
+
+        return value == self.expected
+
+    def __repr__(self):
+        return f"Equals({self.expected!r})"
+
+
+class Prefix(Predicate):
+    """Test that a value starts with prefix, for example Prefix("14.") for macOS 14."""
+
+    def __init__(self, prefix):
+        self.prefix = str(prefix)
+
+    def __call__(self, value):
+        return value is not None and str(value).startswith(self.prefix)
+
+    def __repr__(self):
+        return f"Prefix({self.prefix!r})"
+
+
+class Range(Predicate):
+    """Test that a value is between low and high. Either bound can be left out.
+
+    Values are compared in natural order, so numbers within them are compared as
+    numbers. "14.10" is above "14.9", and ISO 8601 dates like last_check_in compare
+    by date.
+    """
+
+    def __init__(self, low=None, high=None, include_low=True, include_high=True):
+        self.low = None if low is None else natural_key(low)
+        self.high = None if high is None else natural_key(high)
+        self.include_low = include_low
+        self.include_high = include_high
+        self._bounds = (low, high)
+
+    def __call__(self, value):
+        if value is None:
+            return False
+
+        key = natural_key(value)
+
+        if self.low is not None:
+            if key < self.low or (key == self.low and not self.include_low):
+                return False
+
+        if self.high is not None:
+            if key > self.high or (key == self.high and not self.include_high):
+                return False
+
+        return True
+
+    def __repr__(self):
+        return f"Range{self._bounds!r}"
+
+
+class Boolean(Predicate):
+    """Test that a value is true or false.
+
+    Booleans and numbers are read as usual. Strings like "True", "yes", and "on" are
+    true and "False", "no", "off", and "" are false. Any other value does not match.
+    """
+
+    def __init__(self, expected=True):
+        self.expected = bool(expected)
+
+    def __call__(self, value):
+        return as_bool(value) is self.expected
+
+    def __repr__(self):
+        return f"Boolean({self.expected!r})"
+
+
+def natural_key(value):
+    """Return a sort key for value that orders the numbers within it by value."""
+    return _natural_key(str(value))
+
+
+# Values like os_version repeat across many records, so their keys are kept
+@functools.lru_cache(maxsize=4096)
+def _natural_key(text):
+    return tuple(
+        (0, int(part)) if part.isdigit() else (1, part)
+        for part in re.split(r"(\d+)", text)
+        if part
+    )
+
+
+def as_bool(value):
+    """Return value as True or False, or None if it is neither."""
+    if isinstance(value, (bool, int, float)):
+        return bool(value)
+
+    if isinstance(value, str):
+        value = value.strip().lower()
+
+        if value in TRUE_STRINGS:
+            return True
+
+        if value in FALSE_STRINGS:
+            return False
+
+    return None
+
+
+def parse_filter(expression):
+    """Return the (path, predicate) pair for a --filter expression.
+
+    path=value   the value equals value, ignoring case.
+    path^=value  the value starts with value.
+    path>=value  the value is at least value. >, <=, and < work the same way.
+    path         the value is true.
+    !path        the value is false.
+
+    Used as the argparse type of --filter, so a bad expression is reported before any
+    requests are made.
+    """
+    match = FILTER_EXPRESSION.match(expression)
+
+    if match is None:
+        path = expression.strip()
+
+        if not path or re.search(r"[=<>^\s]", path.lstrip("!")):
+            raise argparse.ArgumentTypeError(f'"{expression}" is not a valid filter')
+
+        if path.startswith("!"):
+            return path[1:], Boolean(False)
+
+        return path, Boolean(True)
+
+    path, operator, value = match.group("path", "operator", "value")
+
+    if not value and operator != "=":
+        raise argparse.ArgumentTypeError(
+            f'"{expression}" needs a value after {operator}'
+        )
+
+    if operator == "=":
+        return path, Equals(value, ignore_case=True)
+
+    if operator == "^=":
+        return path, Prefix(value)
+
+    if operator in (">=", ">"):
+        return path, Range(low=value, include_low=operator == ">=")
+
+    return path, Range(high=value, include_high=operator == "<=")
+
+
+def compile_path(path, separator="."):
+    """Return a dotted key path as a tuple of keys, with list positions as integers."""
+    return tuple(int(key) if key.isdigit() else key for key in path.split(separator))
+
+
+def lookup(record, keys):
+    """Return the value at a compiled path in a nested record, or MISSING.
+
+    The value is the one kandjilib.flatten would put under the same dotted key, so a
+    path only reaches a dict or list that is empty. Dicts in a list are numbered from
+    1, and the position of any other value in a list holds the whole list.
+    """
+    value = record
+
+    for position, key in enumerate(keys):
+        if value and isinstance(value, dict):
+            value = value.get(key, MISSING) if isinstance(key, str) else MISSING
+
+        elif value and isinstance(value, list) and isinstance(key, int):
+            if not 1 <= key <= len(value):
+                return MISSING
+
+            item = value[key - 1]
+
+            if not (item and isinstance(item, dict)):
+                # flatten() does not break out values in a list that are not dicts
+                return value if position == len(keys) - 1 else MISSING
+
+            value = item
+
+        else:
+            return MISSING
+
+        if value is MISSING:
+            return MISSING
+
+    if value and isinstance(value, (dict, list)):
+        return MISSING
+
+    return value
+
+
+def split_key(record, name, separator):
+    """Return the compiled path of the value flatten(record, separator) puts under name.
+
+    Returns None if the record has no such key. Keys that contain the separator, like
+    os_version with separator "_", are matched whole, so user_email is found under
+    {"user": {"email": ...}} and os_version under {"os_version": ...}.
+    """
+    if record and isinstance(record, dict):
+        if name in record:
+            return (name,)
+
+        children = record.items()
+
+    elif record and isinstance(record, list):
+        children = enumerate(record, start=1)
+
+    else:
+        return None
+
+    for key, value in children:
+        prefix = f"{key}{separator}"
+
+        if name.startswith(prefix):
+            keys = split_key(value, name[len(prefix) :], separator)
+
+            if keys is not None:
+                return (key, *keys)
+
+        elif name == str(key):
+            return (key,)
+
+    return None
+
+
+def compile_filter(params, separator="."):
+    """Return a function that tells whether a nested record matches every filter.
+
+    params    - the filters, as a dict of dotted key paths or a list of (path, test)
+                pairs. A test is a Predicate, like Prefix("14.") or Range(low="14.2"),
+                or a value the value at the path must equal, for example
+                {"recovery_information.recovery_lock_enabled": True}.
+    separator - separator of the report's flattened column names. Paths without a
+                dot are also looked up as column names, so with separator "_" both
+                user.email and user_email filter on the user's email.
+
+    With only values to equal, a record matches the same filters as
+    flatten(record).items() >= params.items(), but only the values at the filtered
+    paths are read. Paths are split once here instead of for every record, and the
+    tests on a path share one lookup, so each record is checked in one pass over the
+    filtered paths. Records without a value at a filtered path never match.
+    """
+    tests = {}
+
+    for path, test in params.items() if isinstance(params, dict) else params:
+        if not isinstance(test, Predicate):
+            test = Equals(test)
+
+        # Column names are left as strings and split for each record with split_key()
+        keys = path if separator != "." and "." not in path else compile_path(path)
+        tests.setdefault(keys, []).append(test)
+
+    predicates = list(tests.items())
+
+    def matches(record):
+        for keys, path_tests in predicates:
+            if isinstance(keys, str):
+                keys = split_key(record, keys, separator) or ()
+
+            value = lookup(record, keys) if keys else MISSING
+
+            if value is MISSING:
+                return False
+
+            for test in path_tests:
+                if not test(value):
+                    return False
+
+        return True
+
+    return matches
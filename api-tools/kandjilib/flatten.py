@@ -0,0 +1,87 @@
+"""flatten.py
+Flatten nested API responses into a single level of dotted keys for reports.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import functools
+
+
+class Flattener:
+    """Flatten nested dicts into one dict whose keys are the path to each value.
+
+    {"general": {"device_name": "x"}} becomes {"general.device_name": "x"} and the
+    dicts in a list are numbered from 1, so {"users": [{"uid": 501}]} becomes
+    {"users.1.uid": 501}. Other values in a list are not broken out. The key for each
+    of their positions holds the whole list. Empty dicts and lists are kept as they are.
+
+    Records are walked with a stack instead of recursion and every value is written
+    straight into one output dict. The key for each path is built once and kept in a
+    tree that follows the shape of the records, so records of the same shape, like
+    every /details response, reuse the same key strings instead of joining them again.
+    The tree grows with every new path, so use one Flattener per kind of record.
+    """
+
+    def __init__(self, separator="."):
+        self.separator = separator
+        # Each node maps a key to the dotted key of its path, the prefix of the keys
+        # below it, and the node for those keys.
+        self._paths = {}
+
+    def _path(self, node, prefix, key):
+        """Add the path for key below node and return it."""
+        name = f"{prefix}{key}"
+        path = node[key] = (name, name + self.separator, {})
+
+        return path
+
+    def flatten(self, record):
+        """Return a flattened copy of record."""
+        output = {}
+        # Each entry is the items still to be read at one level of the record, the node
+        # for their paths, the prefix of their keys, and the list they came from, if any
+        stack = [(iter(record.items()), self._paths, "", None)]
+
+        while stack:
+            items, node, prefix, parent_list = stack[-1]
+
+            for key, value in items:
+                try:
+                    name, child_prefix, children = node[key]
+                except KeyError:
+                    name, child_prefix, children = self._path(node, prefix, key)
+
+                if value and isinstance(value, dict):
+                    stack.append((iter(value.items()), children, child_prefix, None))
+                    break
+
+                if parent_list is not None:
+                    output[name] = parent_list
+
+                elif value and isinstance(value, list):
+                    stack.append(
+                        (enumerate(value, start=1), children, child_prefix, value)
+                    )
+                    break
+
+                else:
+                    output[name] = value
+
+            else:
+                stack.pop()
+
+        return output
+
+    __call__ = flatten
+
+
+@functools.lru_cache(maxsize=None)
+def flattener(separator="."):
+    """Return the shared Flattener for a separator."""
+    return Flattener(separator=separator)
+
+
+def flatten(input_dict, separator="."):
+    """Flatten JSON."""
+    return flattener(separator).flatten(input_dict)
@@ -0,0 +1,418 @@
+"""inventory.py
+Return device inventory from /v1/devices, either from the API or a local snapshot.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import collections
+import functools
+import itertools
+import json
+import pathlib
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Local libs
+from kandjilib.client import is_error
+
+# Number of device records returned per API call
+DEFAULT_PAGE_SIZE = 300
+
+# Number of pages requested at the same time
+DEFAULT_PAGE_WORKERS = 8
+
+# Default location of the inventory snapshot
+DEFAULT_INVENTORY_PATH = pathlib.Path.home() / ".kandjilib" / "inventory.sqlite3"
+
+# Hours between full syncs. A full sync reads every device so that removed devices and
+# changes made without a check-in, like a new blueprint or device name, are picked up.
+DEFAULT_FULL_SYNC_INTERVAL = 24
+
+# Device fields read by the per-device reports. Pass these as fields to stream_devices
+# to hold compact records instead of the full inventory record for each device.
+SUMMARY_FIELDS = (
+    "device_id",
+    "device_name",
+    "serial_number",
+    "blueprint_name",
+    "os_version",
+    "user",
+    "platform",
+    "last_check_in",
+)
+
+# Fields whose values repeat across many devices. One copy of each value is shared by
+# every record.
+INTERNED_FIELDS = ("blueprint_name", "blueprint_id", "os_version", "platform", "model")
+
+
+def get_pages(
+    client,
+    params=None,
+    ordering="serial_number",
+    limit=DEFAULT_PAGE_SIZE,
+    workers=DEFAULT_PAGE_WORKERS,
+):
+    """Yield pages of device records from /v1/devices in order.
+
+    client   - the KandjiClient used to make the requests.
+    params   - optional filters, for example {"platform": "Mac"}.
+    ordering - field the records are sorted by. Prefix with "-" to reverse the order.
+    limit    - number of records to return per API call.
+    workers  - number of pages requested at the same time.
+
+    Page offsets are known up front, so a window of pages is requested at once instead
+    of waiting for each page before asking for the next. Pages are yielded in offset
+    order and paging stops at the first page with fewer than limit records. A few
+    requests past the end of the inventory are made and thrown away, at most one
+    window's worth.
+    """
+    workers = max(1, int(workers or DEFAULT_PAGE_WORKERS))
+    # offset - set the starting point within a list of resources
+    offsets = itertools.count(0, limit)
+
+    def get_page(offset):
+        """Return a single page of device records."""
+        page_params = dict(params or {})
+        page_params.update(
+            {"ordering": f"{ordering}", "limit": f"{limit}", "offset": f"{offset}"}
+        )
+
+        return client.kandji_api(
+            method="GET", endpoint="/v1/devices", params=page_params
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque(
+            executor.submit(get_page, next(offsets)) for _ in range(workers)
+        )
+
+        try:
+            while pending:
+                response = pending.popleft().result()
+
+                if is_error(response):
+                    sys.exit("Unable to return the device inventory from Kandji...")
+
+                if len(response) > 0:
+                    yield response
+
+                if len(response) < limit:
+                    break
+
+                pending.append(executor.submit(get_page, next(offsets)))
+
+        finally:
+            # Do not send requests for pages that are past the end of the inventory or
+            # that the caller no longer wants.
+            for future in pending:
+                future.cancel()
+
+
+def equals(value, expected):
+    """Return True if a field's value is expected, the way /v1/devices compares it."""
+    return value is not None and str(value) == str(expected)
+
+
+def starts_with(value, prefix):
+    """Return True if a field's value starts with prefix, so "14" matches 14.2.1."""
+    return value is not None and str(value).startswith(str(prefix))
+
+
+# /v1/devices query params an InventorySnapshot can answer and how each one is matched
+# to the field of the same name, the same way the API matches it. Other params, like
+# filevault_enabled, filter on data that is not in the list records.
+SNAPSHOT_FILTERS = {
+    "blueprint_id": equals,
+    "device_id": equals,
+    "os_version": starts_with,
+    "platform": equals,
+    "serial_number": equals,
+}
+
+
+def matches(record, params):
+    """Return True if a device record matches every filter in params.
+
+    Each filter is matched the way the API matches it, so {"os_version": "14"}
+    matches every device on a 14.x release. Only the params in SNAPSHOT_FILTERS can be
+    used.
+    """
+    for key, value in params.items():
+        if not SNAPSHOT_FILTERS[key](record.get(key), value):
+            return False
+
+    return True
+
+
+class DeviceRecord:
+    """Base class of the compact device records made by record_type().
+
+    Records are read like dicts, with record["serial_number"] or record.get("user"),
+    so they can be used anywhere a device record from the API is used. Only the fields
+    a record type was made with are stored, in slots instead of a per-record dict.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        """Return the value of a field, or default if the record does not have it."""
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        """Return the names of the fields in the record."""
+        return self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __repr__(self):
+        return repr({key: self[key] for key in self.__slots__})
+
+
+@functools.lru_cache(maxsize=None)
+def record_type(fields):
+    """Return a DeviceRecord class with a slot for each of the given fields."""
+
+    def __init__(self, record):
+        for field in fields:
+            value = record.get(field)
+
+            if field in INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+
+            setattr(self, field, value)
+
+    return type(
+        "DeviceRecord", (DeviceRecord,), {"__slots__": fields, "__init__": __init__}
+    )
+
+
+class DeviceStream:
+    """Device records that are read from Kandji as they are iterated over.
+
+    Records are yielded as soon as the page they are on arrives, so per-device work
+    can start on the first page while later pages are still being downloaded. count
+    holds the number of records yielded so far.
+
+    If fields is given, each record is replaced by a compact DeviceRecord with only
+    those fields as it is read.
+    """
+
+    def __init__(self, pages, fields=None):
+        self._pages = pages
+        self._record_type = record_type(tuple(fields)) if fields else None
+        self.count = 0
+
+    def __iter__(self):
+        for page in self._pages:
+            for record in page:
+                self.count += 1
+
+                if self._record_type is not None:
+                    record = self._record_type(record)
+
+                yield record
+
+
+def stream_devices(client, params=None, ordering="serial_number", fields=None):
+    """Return a DeviceStream of device inventory.
+
+    If the client has an InventorySnapshot the devices are read from it after syncing
+    any changes. Otherwise, or if params filter on something the snapshot cannot
+    answer (see SNAPSHOT_FILTERS), pages are read from the API while the stream is
+    consumed.
+    fields limits each record to the given fields, for example SUMMARY_FIELDS.
+    """
+    unsupported = sorted(set(params or {}) - set(SNAPSHOT_FILTERS))
+
+    if client.inventory is not None and unsupported:
+        print(
+            f"The inventory snapshot cannot filter on {', '.join(unsupported)}. "
+            "Reading devices from Kandji instead..."
+        )
+
+    if client.inventory is not None and not unsupported:
+        pages = [client.inventory.devices(client, params=params, ordering=ordering)]
+    else:
+        pages = get_pages(client, params=params, ordering=ordering)
+
+    return DeviceStream(pages, fields=fields)
+
+
+def get_devices(client, params=None, ordering="serial_number"):
+    """Return device inventory as a list."""
+    data = list(stream_devices(client, params=params, ordering=ordering))
+
+    if len(data) < 1:
+        print("No devices found...\n")
+        sys.exit()
+
+    return data
+
+
+class InventorySnapshot:
+    """Local SQLite copy of /v1/devices kept up to date by sync().
+
+    An incremental sync reads /v1/devices newest check-in first and stops at the first
+    page that reaches devices which have not checked in since the last sync, so only
+    new and updated devices are downloaded. A full sync reads every device and also
+    removes devices that are no longer in Kandji. A full sync runs on the first use and
+    then once every full_sync_interval hours.
+
+    Snapshots for several Kandji instances can share the same file. Records are kept
+    per API base URL.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_INVENTORY_PATH,
+        full_sync_interval=DEFAULT_FULL_SYNC_INTERVAL,
+        force_full_sync=False,
+    ):
+        self.path = pathlib.Path(path).expanduser()
+        self.full_sync_interval = full_sync_interval * 3600
+        self.force_full_sync = force_full_sync
+        self._synced = set()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS devices ("
+            "base_url TEXT, device_id TEXT, last_check_in TEXT, body TEXT, "
+            "PRIMARY KEY (base_url, device_id))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            "base_url TEXT PRIMARY KEY, watermark TEXT, synced_at REAL, "
+            "full_synced_at REAL)"
+        )
+        self._db.commit()
+
+    def sync(self, client, full=False):
+        """Apply the changes made in Kandji since the last sync and return a summary.
+
+        Returns a dict with the number of devices that were added, updated, removed,
+        and left unchanged, and whether a full sync was done.
+        """
+        base_url = client.base_url
+        state = self._db.execute(
+            "SELECT watermark, full_synced_at FROM sync_state WHERE base_url = ?",
+            (base_url,),
+        ).fetchone()
+        watermark, full_synced_at = state or (None, None)
+
+        full = (
+            full
+            or full_synced_at is None
+            or full_synced_at < time.time() - self.full_sync_interval
+        )
+
+        stored = dict(
+            self._db.execute(
+                "SELECT device_id, body FROM devices WHERE base_url = ?", (base_url,)
+            )
+        )
+        summary = {"full": full, "added": 0, "updated": 0, "removed": 0}
+        seen = set()
+        newest = watermark
+
+        if full:
+            pages = get_pages(client, ordering="serial_number")
+        else:
+            # An incremental sync usually stops after the first page so only ask for two
+            # at a time.
+            pages = get_pages(client, ordering="-last_check_in", workers=2)
+
+        for page in pages:
+            for record in page:
+                device_id = record["device_id"]
+                last_check_in = record.get("last_check_in")
+                body = json.dumps(record)
+                seen.add(device_id)
+
+                if last_check_in and (newest is None or last_check_in > newest):
+                    newest = last_check_in
+
+                if stored.get(device_id) == body:
+                    continue
+
+                summary["added" if device_id not in stored else "updated"] += 1
+                self._db.execute(
+                    "INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?)",
+                    (base_url, device_id, last_check_in, body),
+                )
+
+            # Pages are sorted newest check-in first. Once a page reaches devices that
+            # checked in before the last sync the rest of the inventory is unchanged.
+            oldest = page[-1].get("last_check_in")
+            if not full and watermark and oldest and oldest < watermark:
+                break
+
+        # Stop any page requests that are still queued
+        pages.close()
+
+        if full:
+            removed = [(base_url, device_id) for device_id in stored.keys() - seen]
+            summary["removed"] = len(removed)
+            self._db.executemany(
+                "DELETE FROM devices WHERE base_url = ? AND device_id = ?", removed
+            )
+
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+            (base_url, newest, now, now if full else full_synced_at),
+        )
+        self._db.commit()
+
+        summary["unchanged"] = len(stored) - summary["updated"] - summary["removed"]
+
+        return summary
+
+    def devices(self, client, params=None, ordering="serial_number"):
+        """Sync the snapshot once per run and return the devices matching params.
+
+        Only the params in SNAPSHOT_FILTERS can be used. Any other raises a ValueError.
+        """
+        for key in params or {}:
+            if key not in SNAPSHOT_FILTERS:
+                raise ValueError(f"device records cannot be filtered on {key}")
+
+        if client.base_url not in self._synced:
+            print("Syncing device inventory snapshot...")
+            summary = self.sync(client, full=self.force_full_sync)
+            print(
+                f"{'Full' if summary['full'] else 'Incremental'} sync: "
+                f"{summary['added']} new, {summary['updated']} updated, "
+                f"{summary['removed']} removed, {summary['unchanged']} unchanged"
+            )
+            self._synced.add(client.base_url)
+
+        records = [
+            json.loads(body)
+            for (body,) in self._db.execute(
+                "SELECT body FROM devices WHERE base_url = ?", (client.base_url,)
+            )
+        ]
+
+        field = ordering.lstrip("-")
+        data = [record for record in records if matches(record, params or {})]
+        data.sort(
+            key=lambda record: str(record.get(field) or ""),
+            reverse=ordering.startswith("-"),
+        )
+
+        return data
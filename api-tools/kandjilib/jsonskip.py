@@ -0,0 +1,113 @@
+"""jsonskip.py
+Decode JSON objects while leaving out subtrees that are not needed.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import json
+import re
+
+_DECODER = json.JSONDecoder()
+
+# Decoder for skipped values. Each object is replaced by its number of keys as soon as
+# it is read, so a skipped subtree is never held in memory as a whole.
+_SKIPPER = json.JSONDecoder(object_pairs_hook=len)
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def skip_tree(paths):
+    """Return a nested dict of the keys to skip from a list of dotted key paths.
+
+    For example ["volumes", "users.system_users"] becomes
+    {"volumes": None, "users": {"system_users": None}}.
+    """
+    tree = {}
+
+    for path in paths:
+        *parents, leaf = path.split(".")
+        node = tree
+
+        for parent in parents:
+            node = node.setdefault(parent, {})
+
+            # A parent that is skipped as a whole stays skipped
+            if node is None:
+                break
+
+        else:
+            node[leaf] = None
+
+    return tree
+
+
+def loads(text, skip=()):
+    """Decode a JSON document, leaving out the values at the given key paths.
+
+    text - the JSON document.
+    skip - dotted key paths to leave out, for example ["volumes", "users.system_users"].
+
+    Skipped values are read by the json module but each object in them is dropped as
+    soon as it is read, so the skipped subtrees are never built in memory. The rest is
+    decoded as usual. Documents that are not an object are decoded in full.
+    """
+    tree = skip_tree(skip)
+    index = _WHITESPACE.match(text).end()
+
+    if not tree or not text.startswith("{", index):
+        return json.loads(text)
+
+    data, index = _decode_object(text, index, tree)
+
+    if _WHITESPACE.match(text, index).end() != len(text):
+        raise json.JSONDecodeError("Extra data", text, index)
+
+    return data
+
+
+def _expect(text, index, char):
+    """Return the index after char, which is the next character that is not space."""
+    index = _WHITESPACE.match(text, index).end()
+
+    if not text.startswith(char, index):
+        raise json.JSONDecodeError(f"Expecting '{char}'", text, index)
+
+    return _WHITESPACE.match(text, index + 1).end()
+
+
+def _decode_object(text, index, tree):
+    """Decode the object that starts at index and return it with the index after it."""
+    data = {}
+    index = _expect(text, index, "{")
+
+    if text.startswith("}", index):
+        return data, index + 1
+
+    while True:
+        key, index = _DECODER.raw_decode(text, index)
+        index = _expect(text, index, ":")
+
+        if key not in tree:
+            data[key], index = _DECODER.raw_decode(text, index)
+
+        elif tree[key] is None:
+            index = _skip_value(text, index)
+
+        elif text.startswith("{", index):
+            data[key], index = _decode_object(text, index, tree[key])
+
+        else:
+            data[key], index = _DECODER.raw_decode(text, index)
+
+        index = _WHITESPACE.match(text, index).end()
+
+        if text.startswith("}", index):
+            return data, index + 1
+
+        index = _expect(text, index, ",")
+
+
+def _skip_value(text, index):
+    """Return the index after the value that starts at index."""
+    return _SKIPPER.raw_decode(text, index)[1]
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+"""kandjiapi.py
+Module for interacting with the Kandji API.
+"""
+
+# Github: github.com/kandji-inc/solutions-engineering
+# @captam3rica
+
+# Standard library
+import collections
+
+# Local libs
+from kandjilib import inventory
+from kandjilib.client import KandjiClient
+from kandjilib.fanout import fetch_each
+
+# One pooled client per Kandji API base URL so that connections are reused across
+# every call made by this module.
+CLIENTS = {}
+
+# Per-device endpoints joined by get_each_device_report
+REPORT_VIEWS = ("details", "apps", "status")
+
+
+def get_client(baseurl, headers):
+    """Return the shared client for a Kandji API base URL."""
+    if baseurl not in CLIENTS:
+        CLIENTS[baseurl] = KandjiClient(base_url=baseurl, headers=headers, timeout=10)
+
+    return CLIENTS[baseurl]
+
+
+def get_all_devices(baseurl, headers):
+    """Retrive all Mac computer inventory records from Kandji.
+
+    Returns an iterator. Pages of the inventory are requested several at a time and
+    records are yielded as each page arrives.
+    """
+    return inventory.stream_devices(
+        get_client(baseurl, headers), params={"platform": "Mac"}
+    )
+
+
+def get_all_devices_os_version(baseurl, headers, os_version, prefix=False):
+    """Retrive all Mac computer inventory records from Kandji based on the OS version
+    provided
+
+    The devices are read with a single paginated query that Kandji filters by
+    os_version. With prefix=True os_version 14 also returns devices on 14.1, 14.2.1,
+    and so on. Kandji matches os_version as the start of the version, so only the
+    query's results are checked locally, to keep prefixes to the dots in the version.
+    1 does not return devices on 14.2.1.
+    """
+    version = str(os_version)
+    devices = inventory.stream_devices(
+        get_client(baseurl, headers), params={"platform": "Mac", "os_version": version}
+    )
+
+    if not prefix:
+        return devices
+
+    # With a dot after both, "14" matches 14 and 14.2.1 but not 140
+    return (
+        device
+        for device in devices
+        if f"{device.get('os_version') or ''}.".startswith(f"{version}.")
+    )
+
+
+def get_device_details(baseurl, headers, device_id):
+    """Return device details for specific device."""
+    return get_client(baseurl, headers).kandji_api(
+        method="GET", endpoint=f"/v1/devices/{device_id}/details"
+    )
+
+
+def get_device_apps(baseurl, headers, device_id):
+    """Return applicaitons installed for a specific device."""
+    return get_client(baseurl, headers).kandji_api(
+        method="GET", endpoint=f"/v1/devices/{device_id}/apps"
+    )
+
+
+def get_device_status(baseurl, headers, device_id):
+    """Return applicaitons installed for a specific device."""
+    return get_client(baseurl, headers).kandji_api(
+        method="GET", endpoint=f"/v1/devices/{device_id}/status"
+    )
+
+
+def each_device(baseurl, headers, device_ids, endpoint, workers=None, use_async=False):
+    """Yield the response from an endpoint for every device ID, in device ID order.
+
+    endpoint - endpoint template containing {device_id}, for example
+               "/v1/devices/{device_id}/apps".
+    Several devices are requested at a time. Devices whose request fails are left out.
+    """
+    return (
+        response
+        for response in fetch_each(
+            get_client(baseurl, headers),
+            ({"device_id": device_id} for device_id in device_ids),
+            endpoint,
+            lambda item, response: response,
+            workers=workers,
+            use_async=use_async,
+        )
+        if response is not None
+    )
+
+
+def get_each_device_details(baseurl, headers, device_ids, **kwargs):
+    """Yield device details for every device ID."""
+    return each_device(
+        baseurl, headers, device_ids, "/v1/devices/{device_id}/details", **kwargs
+    )
+
+
+def get_each_device_apps(baseurl, headers, device_ids, **kwargs):
+    """Yield applications installed for every device ID."""
+    return each_device(
+        baseurl, headers, device_ids, "/v1/devices/{device_id}/apps", **kwargs
+    )
+
+
+def get_each_device_status(baseurl, headers, device_ids, **kwargs):
+    """Yield the status for every device ID."""
+    return each_device(
+        baseurl, headers, device_ids, "/v1/devices/{device_id}/status", **kwargs
+    )
+
+
+def get_each_device_report(baseurl, headers, devices, workers=None, use_async=False):
+    """Yield details, apps, and status for every device in a single pass.
+
+    devices - device inventory records, for example from get_all_devices.
+
+    Yields a dict for each device with the inventory record under "device" and the
+    response from each of the REPORT_VIEWS endpoints under its name. The requests for
+    a device are queued together and share the worker pool with the requests for
+    other devices, so the whole report is one sweep over the inventory. A view whose
+    request fails is None.
+    """
+    # Devices whose requests have been queued but whose responses are not yet joined
+    queued = collections.deque()
+
+    def items():
+        """Yield one request per device and view."""
+        for device in devices:
+            queued.append(device)
+
+            for view in REPORT_VIEWS:
+                yield {
+                    "device_id": device["device_id"],
+                    "last_check_in": device.get("last_check_in"),
+                    "view": view,
+                }
+
+    responses = fetch_each(
+        get_client(baseurl, headers),
+        items(),
+        "/v1/devices/{device_id}/{view}",
+        lambda item, response: response,
+        workers=workers,
+        use_async=use_async,
+    )
+
+    # Responses come back in request order, one per view for each device
+    for views in zip(*[responses] * len(REPORT_VIEWS)):
+        yield dict(zip(REPORT_VIEWS, views), device=queued.popleft())
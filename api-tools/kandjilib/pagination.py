@@ -0,0 +1,76 @@
+"""pagination.py
+Read endpoints that are paged by page number, like /v1/blueprints, several pages at a
+time.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Local libs
+from kandjilib.client import is_error
+
+# Number of pages requested at the same time
+DEFAULT_PAGE_WORKERS = 8
+
+
+def get_pages(client, endpoint, params=None, workers=DEFAULT_PAGE_WORKERS):
+    """Yield the results on each page of a page-numbered endpoint in order.
+
+    client   - the KandjiClient used to make the requests.
+    endpoint - the API URL endpoint to target, for example "/v1/blueprints".
+    params   - optional parameters passed with every request.
+    workers  - number of pages requested at the same time.
+
+    The first page holds the total count of records, which gives the number of pages.
+    The remaining pages are then requested at the same time instead of following each
+    page's next link in turn. If records were added while paging, the pages past the
+    expected last page are read one after another until there is no next link.
+    """
+    workers = max(1, int(workers or DEFAULT_PAGE_WORKERS))
+
+    def get_page(page):
+        """Return a single page."""
+        page_params = dict(params or {})
+        page_params.update({"page": f"{page}"})
+
+        response = client.kandji_api(
+            method="GET", endpoint=endpoint, params=page_params
+        )
+
+        if is_error(response):
+            sys.exit(f"Unable to return {endpoint} from Kandji...")
+
+        return response
+
+    response = get_page(1)
+    yield response["results"]
+
+    if response.get("next") is None:
+        return
+
+    # The first page is full, so its size is the page size
+    page_count = math.ceil(response["count"] / max(1, len(response["results"])))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for response in executor.map(get_page, range(2, page_count + 1)):
+            yield response["results"]
+
+    page = page_count
+
+    while response.get("next") is not None:
+        page += 1
+        response = get_page(page)
+        yield response["results"]
+
+
+def get_results(client, endpoint, params=None, workers=DEFAULT_PAGE_WORKERS):
+    """Return the results on every page of a page-numbered endpoint as a list."""
+    return [
+        record
+        for page in get_pages(client, endpoint, params=params, workers=workers)
+        for record in page
+    ]
@@ -0,0 +1,171 @@
+"""prism.py
+Read fleet-wide Prism collections, like /v1/prism/apps, with cursor pagination.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Local libs
+from kandjilib.client import is_error
+
+# Number of Prism records returned per API call
+DEFAULT_PAGE_SIZE = 300
+
+# Returned by peek_cursor when the cursor cannot be found without decoding the page
+NOT_FOUND = object()
+
+_DECODER = json.JSONDecoder()
+
+
+def _skip_space(text, index):
+    """Return the index of the next character in text that is not whitespace."""
+    while index < len(text) and text[index] in " \t\r\n":
+        index += 1
+
+    return index
+
+
+def _decode_value(text, index):
+    """Decode the JSON value after the colon at or past index.
+
+    Returns the value and the index just past it, or NOT_FOUND and None.
+    """
+    index = _skip_space(text, index)
+
+    if not text.startswith(":", index):
+        return NOT_FOUND, None
+
+    try:
+        return _DECODER.raw_decode(text, _skip_space(text, index + 1))
+    except ValueError:
+        return NOT_FOUND, None
+
+
+def peek_cursor(text):
+    """Return the cursor from the raw body of a Prism response.
+
+    Only the first and the last key of the response are looked at, which is where the
+    cursor is found, so the next page can be requested without decoding the records on
+    this one. Returns NOT_FOUND if the cursor is not in either place. The caller should
+    then decode the whole page.
+    """
+    # The cursor is the first key
+    index = _skip_space(text, 0)
+
+    if text.startswith("{", index):
+        index = _skip_space(text, index + 1)
+
+        if text.startswith('"cursor"', index):
+            value, _ = _decode_value(text, index + len('"cursor"'))
+
+            if value is not NOT_FOUND:
+                return value
+
+    # The cursor is the last key. A "cursor" key inside a record is followed by more
+    # of the page, not just the closing brace.
+    index = text.rfind('"cursor"')
+
+    if index > 0:
+        value, end = _decode_value(text, index + len('"cursor"'))
+
+        if value is not NOT_FOUND and text[end:].strip() == "}":
+            return value
+
+    return NOT_FOUND
+
+
+def get_pages(client, category, params=None, limit=DEFAULT_PAGE_SIZE):
+    """Yield pages of records from a Prism category in order.
+
+    client   - the KandjiClient used to make the requests.
+    category - Prism category, for example "apps" or "device_information".
+    params   - optional filters passed with every request.
+    limit    - number of records to return per API call.
+
+    Each response holds the cursor for the next page, so pages cannot be requested
+    ahead of time like offset pages can. Instead the next request is sent as soon as
+    the cursor is read from the raw response, and the page is decoded and handed to
+    the caller while that request is in flight. Paging stops at the first empty page
+    or the first response without a cursor.
+    """
+
+    def get_page(cursor):
+        """Return the raw body of a single page."""
+        page_params = dict(params or {})
+        page_params.update({"limit": f"{limit}", "cursor": f"{cursor}"})
+
+        return client.kandji_api(
+            method="GET",
+            endpoint=f"/v1/prism/{category}",
+            params=page_params,
+            decode=lambda response: response.text,
+        )
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+
+        def next_page(cursor):
+            """Request the page at cursor, if there is one."""
+            return executor.submit(get_page, cursor) if cursor else None
+
+        # cursor - starts from the beginning of the collection and is used to retrieve
+        # the next batch of records until all records are returned
+        pending = executor.submit(get_page, "")
+
+        try:
+            while pending is not None:
+                text = pending.result()
+
+                if is_error(text):
+                    sys.exit(f"Unable to return Prism {category} from Kandji...")
+
+                cursor = peek_cursor(text)
+                pending = next_page(cursor) if cursor is not NOT_FOUND else None
+
+                response = json.loads(text)
+
+                if cursor is NOT_FOUND:
+                    pending = next_page(response.get("cursor"))
+
+                records = response.get("data", [])
+
+                if len(records) == 0:
+                    break
+
+                yield records
+
+        finally:
+            # Do not send a request the caller no longer wants
+            if pending is not None:
+                pending.cancel()
+
+
+def stream_records(client, category, params=None, limit=DEFAULT_PAGE_SIZE):
+    """Yield every record in a Prism category as its page arrives."""
+    for page in get_pages(client, category, params=params, limit=limit):
+        yield from page
+
+
+def get_categories(client, categories, params=None, limit=DEFAULT_PAGE_SIZE):
+    """Return the records in several Prism categories, read at the same time.
+
+    categories - Prism categories, for example ["apps", "device_information"].
+
+    Returns a dict of records keyed by category. Each category is paged on its own
+    thread, so a large export takes about as long as its largest category.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, len(categories))) as executor:
+        futures = {
+            category: executor.submit(
+                lambda category: list(
+                    stream_records(client, category, params=params, limit=limit)
+                ),
+                category,
+            )
+            for category in categories
+        }
+
+        return {category: future.result() for category, future in futures.items()}
@@ -0,0 +1,124 @@
+"""ratelimit.py
+Pace requests to the Kandji API rate limit and back off together when it is reached.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import email.utils
+import threading
+import time
+from datetime import datetime, timezone
+
+# The Kandji API allows 10,000 requests per hour for each tenant.
+DEFAULT_RATE_LIMIT = 10000
+DEFAULT_RATE_LIMIT_PERIOD = 3600
+
+# Seconds of requests the bucket holds. A run can send this many seconds' worth of
+# requests at once before it is held to the rate, so a short run still starts quickly
+# but no run can send more than a few seconds ahead of the limit.
+DEFAULT_BURST_SECONDS = 5
+
+# Seconds to wait after a 429 response that does not include a Retry-After header. The
+# wait doubles for each 429 in a row up to MAX_RETRY_AFTER.
+DEFAULT_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class TokenBucket:
+    """Token bucket shared by every thread or coroutine that uses a client.
+
+    The bucket holds up to capacity tokens and refills at rate tokens per second. Each
+    request takes one token. capacity defaults to DEFAULT_BURST_SECONDS of the rate, and
+    the bucket starts full. When the bucket is empty a request waits for the next
+    token instead of being sent, so a pool of workers is held to the rate as a whole.
+
+    reserve() does not block. It takes a token and returns the number of seconds the
+    caller should wait before sending its request, which lets threads use time.sleep()
+    and coroutines use asyncio.sleep() with the same bucket.
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE_LIMIT / DEFAULT_RATE_LIMIT_PERIOD,
+        capacity=None,
+    ):
+        if capacity is None:
+            capacity = max(1, rate * DEFAULT_BURST_SECONDS)
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._resume_at = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return the number of seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+
+            # The bucket does not refill while requests are paused
+            if now > self._updated:
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+            # Tokens can go below zero. Each caller waits for the token it borrowed so
+            # requests are spread out evenly once the bucket is empty.
+            self._tokens -= 1
+            wait = max(0, self._updated - now)
+
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+
+            return wait
+
+    def wait(self):
+        """Block the calling thread until a request can be sent."""
+        delay = self.reserve()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """Hold back every request for the given number of seconds.
+
+        Returns True if this pushed the resume time out. When many workers are rate
+        limited at the same time only the first one needs to report it.
+        """
+        with self._lock:
+            resume_at = time.monotonic() + seconds
+
+            if resume_at <= self._resume_at:
+                return False
+
+            # Requests that take a token from now on wait until the pause is over
+            self._resume_at = resume_at
+            self._updated = max(self._updated, resume_at)
+
+            return True
+
+
+def retry_after(header, attempt=0):
+    """Return the number of seconds to wait based on a Retry-After header.
+
+    header  - value of the Retry-After header. This can be a number of seconds or an
+              HTTP date. If it is missing or cannot be read, fall back to a wait that
+              doubles with each attempt.
+    attempt - number of 429 responses in a row for this request, starting at 0.
+    """
+    if header:
+        try:
+            return max(0, float(header))
+        except ValueError:
+            pass
+
+        try:
+            retry_at = email.utils.parsedate_to_datetime(header)
+            return max(0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
+
+    return min(MAX_RETRY_AFTER, DEFAULT_RETRY_AFTER * 2**attempt)
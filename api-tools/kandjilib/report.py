@@ -0,0 +1,280 @@
+"""report.py
+Write report rows to CSV or Parquet files.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import collections
+import csv
+import json
+import pathlib
+import pickle
+import sys
+import tempfile
+
+# pyarrow is only needed when a report is written with --format parquet so it is
+# imported lazily.
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Local libs
+from kandjilib.inventory import INTERNED_FIELDS
+
+# Report formats that can be passed to --format
+FORMATS = ("csv", "parquet")
+
+DEFAULT_FORMAT = "csv"
+
+# Number of rows in each record batch of a Parquet report
+BATCH_SIZE = 10_000
+
+# Columns whose values repeat across many devices. They are dictionary encoded in
+# Parquet reports so each value is stored once. A flattened column like
+# general.blueprint_name is matched on the part after the last dot.
+DICTIONARY_FIELDS = INTERNED_FIELDS + ("model_name",)
+
+
+def check_format(report_format):
+    """Return report_format if reports can be written in it, otherwise exit.
+
+    Used as the argparse type of --format so a missing pyarrow module is reported
+    before any requests are made.
+    """
+    if report_format == "parquet" and pyarrow is None:
+        sys.exit(
+            "Looks like you need to install the pyarrow module to use --format "
+            "parquet. Open a Terminal and run python3 -m pip install pyarrow."
+        )
+
+    return report_format
+
+
+def report_path(report_name, report_format=None):
+    """Return report_name with the file extension of the given report format."""
+    report_format = check_format(report_format or DEFAULT_FORMAT)
+
+    return str(pathlib.PurePath(report_name).with_suffix(f".{report_format}"))
+
+
+def lead_columns(sort_by):
+    """Return a column order that puts the columns containing sort_by first.
+
+    The other columns keep the order they were found in.
+    """
+
+    def order(columns):
+        return sorted(columns, key=lambda column: sort_by in column, reverse=True)
+
+    return order
+
+
+class ReportWriter:
+    """Write rows of dicts to a CSV report as they are produced.
+
+    The columns of the report are every key found in any row, in the order they were
+    first seen. The header can only be written once every row has been seen, so rows
+    are written to a temporary spool file as they arrive and only the columns are kept
+    in memory. close() writes the header and then copies the rows from the spool into
+    the report.
+
+    report_name - path of the CSV report. It is not created until close().
+    order       - optional function that is given the list of columns and returns
+                  them in the order they should appear in the report.
+    """
+
+    def __init__(self, report_name, order=None):
+        self.report_name = report_name
+        self.order = order
+        self.count = 0
+        # A dict is used as an ordered set of column names
+        self._columns = {}
+        self._spool = tempfile.TemporaryFile()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    @property
+    def columns(self):
+        """Return the columns of the report in order."""
+        columns = list(self._columns)
+
+        return self.order(columns) if self.order else columns
+
+    def writerow(self, row):
+        """Add a row to the report."""
+        self._columns.update(dict.fromkeys(row))
+        pickle.dump(row, self._spool, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+
+    def writerows(self, rows):
+        """Add every row from an iterable to the report."""
+        for row in rows:
+            self.writerow(row)
+
+    def close(self):
+        """Write the report and remove the spool file."""
+        if self._spool.closed:
+            return
+
+        with open(self.report_name, mode="w", encoding="utf-8", newline="") as report:
+            writer = csv.DictWriter(report, fieldnames=self.columns)
+
+            # Write headers to CSV
+            writer.writeheader()
+
+            writer.writerows(self._rows())
+
+        self._spool.close()
+
+    def _rows(self):
+        """Yield the rows in the spool file in the order they were written."""
+        self._spool.seek(0)
+
+        for _ in range(self.count):
+            yield pickle.load(self._spool)
+
+    def discard(self):
+        """Remove the spool file without writing the report."""
+        self._spool.close()
+
+
+class ParquetReportWriter(ReportWriter):
+    """Write rows of dicts to a Parquet report as they are produced.
+
+    Rows are spooled the same way as ReportWriter while the columns, and the types of
+    the values in each column, are collected. close() then writes the rows to the
+    report in Arrow record batches of BATCH_SIZE rows, one column at a time.
+
+    A column holds booleans, integers, floats, or strings when every value in it is of
+    that type. Other columns, like ones that mix types or hold lists, are written as
+    strings, with lists and dicts written as JSON. Columns named in DICTIONARY_FIELDS
+    are dictionary encoded.
+    """
+
+    def __init__(self, report_name, order=None):
+        check_format("parquet")
+        super().__init__(report_name, order=order)
+        self._types = collections.defaultdict(set)
+
+    def writerow(self, row):
+        """Add a row to the report."""
+        super().writerow(row)
+
+        for key, value in row.items():
+            if value is not None:
+                self._types[key].add(type(value))
+
+    def schema(self):
+        """Return the Arrow schema of the report."""
+        fields = []
+
+        for column in self.columns:
+            types = self._types[column]
+
+            if types == {bool}:
+                data_type = pyarrow.bool_()
+            elif types == {int}:
+                data_type = pyarrow.int64()
+            elif types and types <= {int, float}:
+                data_type = pyarrow.float64()
+            elif column.rsplit(".", 1)[-1] in DICTIONARY_FIELDS:
+                data_type = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+            else:
+                data_type = pyarrow.string()
+
+            fields.append(pyarrow.field(column, data_type))
+
+        return pyarrow.schema(fields)
+
+    def close(self):
+        """Write the report and remove the spool file."""
+        if self._spool.closed:
+            return
+
+        schema = self.schema()
+
+        with pyarrow.parquet.ParquetWriter(
+            self.report_name, schema, compression="zstd"
+        ) as writer:
+            batch = []
+
+            for row in self._rows():
+                batch.append(row)
+
+                if len(batch) == BATCH_SIZE:
+                    writer.write_batch(record_batch(batch, schema))
+                    batch = []
+
+            if batch:
+                writer.write_batch(record_batch(batch, schema))
+
+        self._spool.close()
+
+
+def record_batch(rows, schema):
+    """Return an Arrow record batch of rows with the given schema."""
+    arrays = []
+
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+
+        if pyarrow.types.is_dictionary(field.type) or pyarrow.types.is_string(
+            field.type
+        ):
+            array = pyarrow.array(
+                [string_value(value) for value in values], pyarrow.string()
+            )
+
+            if pyarrow.types.is_dictionary(field.type):
+                array = array.dictionary_encode()
+
+        else:
+            array = pyarrow.array(values, field.type)
+
+        arrays.append(array)
+
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def string_value(value):
+    """Return a report value as a string. Lists and dicts are returned as JSON."""
+    if value is None or isinstance(value, str):
+        return value
+
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+
+    return str(value)
+
+
+def open_report(report_name, order=None):
+    """Return a ReportWriter for the format given by the file extension of report_name.
+
+    Reports ending in .parquet are written with ParquetReportWriter and every other
+    report is written as a CSV.
+    """
+    if pathlib.PurePath(report_name).suffix == ".parquet":
+        return ParquetReportWriter(report_name, order=order)
+
+    return ReportWriter(report_name, order=order)
+
+
+def write_report(rows, report_name, order=None):
+    """Write rows of dicts to a report and return the number of rows written.
+
+    The format of the report is given by the file extension of report_name.
+    """
+    with open_report(report_name, order=order) as writer:
+        writer.writerows(rows)
+
+    return writer.count
@@ -0,0 +1,104 @@
+"""retry.py
+Retry idempotent requests after transient server errors without adding to an outage.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import random
+import threading
+
+# Status codes that usually mean the API or a proxy in front of it had a brief problem
+RETRY_STATUS_CODES = (502, 503, 504)
+
+# Only requests that can be sent twice without side effects are retried
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Number of times a single request is retried
+DEFAULT_RETRIES = 4
+
+# The wait before retry n is a random number of seconds between 0 and
+# DEFAULT_BACKOFF * 2**n, capped at MAX_BACKOFF.
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30
+
+# Retries allowed for the whole run. A run can always make DEFAULT_BUDGET_MINIMUM
+# retries, plus one for every 1 / DEFAULT_BUDGET_RATIO requests.
+DEFAULT_BUDGET_RATIO = 0.1
+DEFAULT_BUDGET_MINIMUM = 20
+
+
+class RetryBudget:
+    """Limit retries to a share of the requests made during a run.
+
+    When the API is having an outage every request fails, and retrying each one
+    several times multiplies the load on a service that is already struggling. The
+    budget lets a run ride out a few failures but stops retrying once failures become
+    the norm.
+    """
+
+    def __init__(self, ratio=DEFAULT_BUDGET_RATIO, minimum=DEFAULT_BUDGET_MINIMUM):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.requests = 0
+        self.retries = 0
+        self._reported = False
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """Count a new request towards the budget."""
+        with self._lock:
+            self.requests += 1
+
+    def withdraw(self):
+        """Take one retry from the budget. Returns False if the budget is used up."""
+        with self._lock:
+            if self.retries >= self.minimum + self.requests * self.ratio:
+                # Only report this once
+                if not self._reported:
+                    print(
+                        "Retry budget used up. Failed requests will not be retried..."
+                    )
+                    self._reported = True
+
+                return False
+
+            self.retries += 1
+
+            return True
+
+
+class RetryPolicy:
+    """Decide whether and when to retry a request.
+
+    delay() returns the number of seconds to wait, so threads can use time.sleep() and
+    coroutines can use asyncio.sleep() with the same policy. The wait grows
+    exponentially with full jitter so that workers that failed together do not retry
+    together.
+    """
+
+    def __init__(
+        self,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        max_backoff=MAX_BACKOFF,
+        budget=None,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget or RetryBudget()
+
+    def delay(self, method, attempt):
+        """Return the seconds to wait before retrying, or None to give up.
+
+        method  - HTTP method of the request.
+        attempt - number of retries already made for this request, starting at 0.
+        """
+        if method.upper() not in IDEMPOTENT_METHODS or attempt >= self.retries:
+            return None
+
+        if not self.budget.withdraw():
+            return None
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
@@ -0,0 +1,12 @@
+"""conftest.py
+Make the shared kandjilib package importable from the tests.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import pathlib
+import sys
+
+# The tests run against the kandjilib folder at the root of api-tools
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
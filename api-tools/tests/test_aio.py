@@ -0,0 +1,95 @@
+"""test_aio.py
+Tests for kandjilib.aio.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Standard library
+import http.server
+import json
+import threading
+import time
+
+# Third party
+import pytest
+
+# Local libs
+from kandjilib import client, fanout, ratelimit
+
+pytest.importorskip("aiohttp")
+
+# Seconds each request to the test server takes
+LATENCY = 0.5
+
+
+class SlowServer(http.server.ThreadingHTTPServer):
+    """HTTP server that answers every GET slowly and records the most in flight."""
+
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SlowHandler)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.peak = max(self.server.peak, self.server.in_flight)
+
+        time.sleep(LATENCY)
+
+        with self.server.lock:
+            self.server.in_flight -= 1
+
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    slow_server = SlowServer()
+    thread = threading.Thread(target=slow_server.serve_forever, daemon=True)
+    thread.start()
+
+    yield slow_server
+
+    slow_server.shutdown()
+    slow_server.server_close()
+
+
+@pytest.mark.parametrize("workers", [None, 200])
+def test_workers_sets_the_requests_in_flight(server, workers):
+    kandji = client.KandjiClient(
+        base_url=f"http://127.0.0.1:{server.server_port}",
+        headers={},
+        rate_limiter=ratelimit.TokenBucket(rate=1_000_000),
+    )
+    devices = [{"device_id": f"device-{index}"} for index in range(400)]
+
+    results = list(
+        fanout.fetch_each(
+            kandji,
+            devices,
+            "/v1/devices/{device_id}/apps",
+            lambda item, response: response["path"],
+            workers=workers,
+            use_async=True,
+        )
+    )
+
+    assert results == [f"/v1/devices/device-{index}/apps" for index in range(400)]
+    assert server.peak == (workers or fanout.aio.DEFAULT_CONCURRENCY)
@@ -0,0 +1,41 @@
+"""test_cache.py
+Tests for kandjilib.cache.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Local libs
+from kandjilib import cache
+
+
+def stored_size(response_cache):
+    """Return the size of the responses in the cache database."""
+    return response_cache._db.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM responses"
+    ).fetchone()[0]
+
+
+def test_size_limit_is_kept_during_a_run(tmp_path):
+    response_cache = cache.ResponseCache(tmp_path / "cache.sqlite3", max_size=10_000)
+    body = {"details": "x" * 1000}
+
+    for device in range(100):
+        response_cache.put(f"device-{device}", "version", body)
+        assert stored_size(response_cache) <= response_cache.max_size
+
+    # The latest responses are kept and the least recently used are removed
+    assert response_cache.get("device-99", "version") == body
+    assert response_cache.get("device-0", "version") is None
+    response_cache.close()
+
+
+def test_replaced_responses_are_not_counted_twice(tmp_path):
+    response_cache = cache.ResponseCache(tmp_path / "cache.sqlite3", max_size=10_000)
+    body = {"details": "x" * 1000}
+
+    for _ in range(50):
+        response_cache.put("device-0", "version", body)
+
+    assert response_cache.get("device-0", "version") == body
+    assert stored_size(response_cache) < 2000
+    response_cache.close()
@@ -0,0 +1,85 @@
+"""test_checkpoint.py
+Tests for kandjilib.checkpoint and resuming kandjilib.fanout.fetch_each.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Local libs
+from kandjilib import checkpoint, fanout
+
+
+class FakeKandji:
+    """Stand-in for a KandjiClient that records the endpoints it is asked for."""
+
+    base_url = "https://example.api.kandji.io/api"
+    adaptive = None
+    cache = None
+
+    def __init__(self, journal=None):
+        self.journal = journal
+        self.requested = []
+
+    def kandji_api(self, method, endpoint, decode=None):
+        self.requested.append(endpoint)
+        return {"endpoint": endpoint}
+
+
+def devices(check_in):
+    """Return device records that all last checked in at check_in."""
+    return [
+        {"device_id": f"device-{index}", "last_check_in": check_in}
+        for index in range(10)
+    ]
+
+
+def run(journal, items, stop_after=None):
+    """Fetch /details for each item and return the results read."""
+    kandji = FakeKandji(journal)
+    results = []
+
+    for result in fanout.fetch_each(
+        kandji,
+        items,
+        "/v1/devices/{device_id}/details",
+        lambda item, response: response["endpoint"],
+        workers=1,
+    ):
+        results.append(result)
+
+        if len(results) == stop_after:
+            break
+
+    return kandji, results
+
+
+def test_resume_skips_finished_devices_that_checked_in_since(tmp_path):
+    path = tmp_path / "journal.sqlite3"
+    run(checkpoint.CheckpointJournal(path), devices("2026-10-01T00:00:00Z"), 4)
+
+    # Every device has checked in again before the run is resumed
+    journal = checkpoint.CheckpointJournal(path, resume=True)
+    kandji, results = run(journal, devices("2026-10-01T00:15:00Z"))
+
+    assert len(results) == 10
+    assert journal.hits >= 4
+    assert len(kandji.requested) == 10 - journal.hits
+    assert "/v1/devices/device-0/details" not in kandji.requested
+
+
+def test_refetch_updated_requests_devices_that_checked_in_since(tmp_path):
+    path = tmp_path / "journal.sqlite3"
+    run(checkpoint.CheckpointJournal(path), devices("2026-10-01T00:00:00Z"), 4)
+
+    journal = checkpoint.CheckpointJournal(path, resume=True, refetch_updated=True)
+    kandji, results = run(journal, devices("2026-10-01T00:15:00Z"))
+
+    assert len(results) == 10
+    assert journal.hits == 0
+    assert len(kandji.requested) == 10
+
+
+def test_journal_is_deleted_once_a_run_finishes(tmp_path):
+    path = tmp_path / "journal.sqlite3"
+    run(checkpoint.CheckpointJournal(path), devices("2026-10-01T00:00:00Z"))
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,68 @@
+"""test_filters.py
+Tests for kandjilib.filters.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Third party
+import pytest
+
+# Local libs
+from kandjilib import filters
+from kandjilib.flatten import flatten
+
+# A /v1/devices record with nested dicts, lists, and keys that contain underscores
+RECORD = {
+    "device_id": "device-1",
+    "serial_number": "C020000001",
+    "os_version": "14.2.1",
+    "agent_installed": "True",
+    "is_missing": False,
+    "user": {"email": "jane@example.com", "name": "Jane", "is_archived": False},
+    "blueprint": {},
+    "tags": ["finance", "laptops"],
+    "volumes": [{"name": "Macintosh HD", "encrypted": "Yes"}],
+}
+
+
+@pytest.mark.parametrize("column", list(flatten(RECORD, separator="_")))
+def test_report_columns_can_be_filtered_on(column):
+    value = flatten(RECORD, separator="_")[column]
+    matches = filters.compile_filter([(column, value)], separator="_")
+
+    assert matches(RECORD)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "user_email=JANE@example.com",
+        "user.email=jane@example.com",
+        "os_version>=14.2",
+        "volumes_1_encrypted=yes",
+        "!user_is_archived",
+        "agent_installed",
+    ],
+)
+def test_dotted_paths_and_column_names_match(expression):
+    matches = filters.compile_filter([filters.parse_filter(expression)], separator="_")
+
+    assert matches(RECORD)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["user_email=john@example.com", "user_phone=1", "volumes_2_name=Data", "blueprint"],
+)
+def test_column_names_that_do_not_match(expression):
+    matches = filters.compile_filter([filters.parse_filter(expression)], separator="_")
+
+    assert not matches(RECORD)
+
+
+def test_column_names_are_only_read_with_a_report_separator():
+    matches = filters.compile_filter(
+        [filters.parse_filter("user_email=jane@example.com")]
+    )
+
+    assert not matches(RECORD)
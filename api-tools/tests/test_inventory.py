@@ -0,0 +1,148 @@
+"""test_inventory.py
+Tests for kandjilib.inventory.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Third party
+import pytest
+
+# Local libs
+from kandjilib import inventory
+
+PLATFORMS = ("Mac", "iPhone", "iPad", "AppleTV")
+OS_VERSIONS = ("12.7", "13.6.1", "14.1", "14.2.1", "14.10", "17.4", "")
+
+
+class FakeKandji:
+    """Stand-in for a KandjiClient that answers /v1/devices the way the API does.
+
+    os_version is matched as a prefix and the other params exactly. FileVault status is
+    kept apart from the device records, as it is in Kandji, where it comes from the
+    device details.
+    """
+
+    base_url = "https://example.api.kandji.io/api"
+
+    def __init__(self, devices, filevault):
+        self.devices = devices
+        self.filevault = filevault
+        self.inventory = None
+        self.requests = []
+
+    def kandji_api(self, method, endpoint, params=None):
+        self.requests.append(dict(params))
+        params = dict(params)
+        ordering = params.pop("ordering")
+        limit = int(params.pop("limit"))
+        offset = int(params.pop("offset"))
+        devices = self.devices
+
+        for key, value in params.items():
+            if key == "os_version":
+                devices = [d for d in devices if d[key].startswith(value)]
+            elif key == "filevault_enabled":
+                devices = [
+                    d
+                    for d in devices
+                    if str(self.filevault[d["device_id"]]).lower() == value
+                ]
+            else:
+                devices = [d for d in devices if str(d[key]) == value]
+
+        devices = sorted(
+            devices,
+            key=lambda d: d[ordering.lstrip("-")],
+            reverse=ordering.startswith("-"),
+        )
+
+        return devices[offset:][:limit]
+
+
+def device(index):
+    """Return a device record like those in /v1/devices."""
+    return {
+        "device_id": f"device-{index:04d}",
+        "device_name": f"Device {index}",
+        "serial_number": f"C02{index:07d}",
+        "platform": PLATFORMS[index % len(PLATFORMS)],
+        "os_version": OS_VERSIONS[index % len(OS_VERSIONS)],
+        "blueprint_id": f"blueprint-{index % 3}",
+        "blueprint_name": f"Blueprint {index % 3}",
+        "user": {"email": f"user{index}@example.com"} if index % 4 else "",
+        "last_check_in": f"2026-10-{1 + index % 28:02d}T00:00:00Z",
+    }
+
+
+@pytest.fixture
+def kandji():
+    devices = [device(index) for index in range(700)]
+    filevault = {d["device_id"]: bool(index % 3) for index, d in enumerate(devices)}
+
+    return FakeKandji(devices, filevault)
+
+
+# The /v1/devices params set by the scripts' filter options: --platform, --blueprint,
+# --serial-number, --os-version, and --filevault.
+PARAMS = [
+    {},
+    *({"platform": platform} for platform in PLATFORMS),
+    {"blueprint_id": "blueprint-1"},
+    {"serial_number": "C020000042"},
+    {"serial_number": "c020000042"},
+    {"os_version": "14"},
+    {"os_version": "14.1"},
+    {"os_version": "14.2.1"},
+    {"os_version": "1"},
+    {"os_version": "15"},
+    {"filevault_enabled": "true"},
+    {"filevault_enabled": "false"},
+    {"platform": "Mac", "os_version": "14", "blueprint_id": "blueprint-2"},
+    {"platform": "Mac", "filevault_enabled": "true"},
+]
+
+
+@pytest.mark.parametrize("params", PARAMS, ids=repr)
+def test_snapshot_returns_the_same_devices_as_the_api(kandji, tmp_path, params):
+    live = list(inventory.stream_devices(kandji, params=params))
+
+    kandji.inventory = inventory.InventorySnapshot(tmp_path / "inventory.sqlite3")
+    snapshot = list(inventory.stream_devices(kandji, params=params))
+
+    assert snapshot == live
+
+
+def test_snapshot_reads_from_the_api_for_params_it_cannot_answer(kandji, tmp_path):
+    kandji.inventory = inventory.InventorySnapshot(tmp_path / "inventory.sqlite3")
+    list(inventory.stream_devices(kandji, params={"os_version": "14"}))
+    kandji.requests.clear()
+
+    list(inventory.stream_devices(kandji, params={"filevault_enabled": "true"}))
+
+    assert kandji.requests
+    assert all(r["filevault_enabled"] == "true" for r in kandji.requests)
+
+
+def test_snapshot_rejects_params_it_cannot_answer(kandji, tmp_path):
+    snapshot = inventory.InventorySnapshot(tmp_path / "inventory.sqlite3")
+
+    with pytest.raises(ValueError):
+        snapshot.devices(kandji, params={"filevault_enabled": "true"})
+
+
+def test_os_version_params_match_by_prefix():
+    records = [device(index) for index in range(len(OS_VERSIONS))]
+    versions = {
+        prefix: [
+            r["os_version"]
+            for r in records
+            if inventory.matches(r, {"os_version": prefix})
+        ]
+        for prefix in ("14", "14.1", "13.6.1")
+    }
+
+    assert versions == {
+        "14": ["14.1", "14.2.1", "14.10"],
+        "14.1": ["14.1", "14.10"],
+        "13.6.1": ["13.6.1"],
+    }
@@ -0,0 +1,62 @@
+"""test_kandjiapi.py
+Tests for kandjilib.kandjiapi.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Local libs
+from kandjilib import kandjiapi
+
+OS_VERSIONS = ("14", "14.1", "14.2.1", "140.1", "13.6", "1.0")
+
+
+class FakeKandji:
+    """Stand-in for a KandjiClient that answers /v1/devices like the API.
+
+    os_version is matched as the start of the version and platform exactly.
+    """
+
+    base_url = "https://example.api.kandji.io/api"
+    inventory = None
+
+    def __init__(self):
+        self.devices = [
+            {"device_id": f"device-{index}", "platform": platform, "os_version": v}
+            for index, v in enumerate(OS_VERSIONS)
+            for platform in ("Mac", "iPhone")
+        ]
+        self.requests = []
+
+    def kandji_api(self, method, endpoint, params=None):
+        self.requests.append(dict(params))
+        offset, limit = int(params["offset"]), int(params["limit"])
+
+        return [
+            device
+            for device in self.devices
+            if device["platform"] == params["platform"]
+            and device["os_version"].startswith(params["os_version"])
+        ][offset:][:limit]
+
+
+def device_os(monkeypatch, os_version):
+    """Return the OS versions of the devices bumbledore --os-prefix lists."""
+    kandji = FakeKandji()
+    monkeypatch.setattr(kandjiapi, "get_client", lambda baseurl, headers: kandji)
+    devices = kandjiapi.get_all_devices_os_version(
+        kandji.base_url, {}, os_version, prefix=True
+    )
+
+    return [device["os_version"] for device in devices], kandji.requests
+
+
+def test_os_prefix_is_filtered_by_kandji(monkeypatch):
+    versions, requests = device_os(monkeypatch, "14")
+
+    assert versions == ["14", "14.1", "14.2.1"]
+    assert all(r["os_version"] == "14" and r["platform"] == "Mac" for r in requests)
+
+
+def test_os_prefix_follows_the_dots_in_the_version(monkeypatch):
+    assert device_os(monkeypatch, "1")[0] == ["1.0"]
+    assert device_os(monkeypatch, "14.1")[0] == ["14.1"]
@@ -0,0 +1,83 @@
+"""test_ratelimit.py
+Tests for kandjilib.ratelimit.
+"""
+
+# Github: github.com/kandji-inc/support
+
+# Local libs
+from kandjilib import ratelimit
+
+
+class FakeClock:
+    """Stand-in for time.monotonic() that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def send_times(bucket, clock, requests):
+    """Return the time each of a burst of requests is sent at, all asked for at once."""
+    return [clock.now + bucket.reserve() for _ in range(requests)]
+
+
+def test_default_capacity_is_a_few_seconds_of_the_rate(monkeypatch):
+    monkeypatch.setattr(ratelimit.time, "monotonic", FakeClock())
+    bucket = ratelimit.TokenBucket()
+
+    assert bucket.capacity == bucket.rate * ratelimit.DEFAULT_BURST_SECONDS
+    assert bucket.capacity < 20
+
+
+def test_burst_larger_than_capacity_is_held_to_the_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    bucket = ratelimit.TokenBucket()
+    capacity = int(bucket.capacity)
+
+    times = send_times(bucket, clock, 1000)
+
+    # The requests the bucket holds go out right away
+    assert all(sent == clock.now for sent in times[:capacity])
+    assert times[capacity] > clock.now
+
+    # The rest are spaced out at the rate
+    steady = times[capacity:]
+    rate = (len(steady) - 1) / (steady[-1] - steady[0])
+    assert abs(rate - bucket.rate) / bucket.rate < 0.01
+
+    # An hour never holds more than the hourly limit plus the burst
+    hour = [sent for sent in times if sent < clock.now + 3600]
+    assert len(hour) <= ratelimit.DEFAULT_RATE_LIMIT + capacity
+
+
+def test_full_hour_stays_under_the_limit(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    bucket = ratelimit.TokenBucket()
+    start = clock.now
+
+    # Workers that send as soon as the bucket lets them, for an hour
+    sent = 0
+    while True:
+        clock.now += bucket.reserve()
+
+        if clock.now >= start + ratelimit.DEFAULT_RATE_LIMIT_PERIOD:
+            break
+
+        sent += 1
+
+    assert sent <= ratelimit.DEFAULT_RATE_LIMIT + bucket.capacity
+    assert sent >= ratelimit.DEFAULT_RATE_LIMIT * 0.99
+
+
+def test_set_rate_limit_uses_the_default_burst():
+    from kandjilib.client import KandjiClient
+
+    client = KandjiClient(base_url="https://example.invalid/api", headers={})
+    client.set_rate_limit(20)
+
+    assert client.rate_limiter.rate == 20
+    assert client.rate_limiter.capacity == 20 * ratelimit.DEFAULT_BURST_SECONDS
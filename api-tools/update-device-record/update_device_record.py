@@ -69,9 +69,22 @@ except ImportError:
         "python3 -m pip install requests."
     )
 
-from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
+# Local libs
+# kandjilib is shared by the api-tools scripts. It is found either next to this script
+# or at the root of the api-tools folder.
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+try:
+    from kandjilib import client, pagination
+except ImportError as import_error:
+    print(import_error)
+    sys.exit(
+        "Unable to import kandjilib. Make sure that the kandjilib folder is in the same "
+        "folder as this script or one folder above it."
+    )
+
 ########################################################################################
 ######################### UPDATE VARIABLES BELOW #######################################
 ########################################################################################
@@ -250,6 +263,20 @@ def http_errors(resp, resp_code, err_msg):
         print(err_msg)
 
 
+# Pooled API client shared by every request this script makes. Connection errors are
+# retried with a short backoff. Retries on server errors and 429 responses are left to
+# KandjiClient.send() so that they go through the shared retry budget and rate limiter,
+# and updates are never sent twice after the API responded.
+CLIENT = client.KandjiClient(
+    base_url=BASE_URL,
+    headers=HEADERS,
+    max_retries=Retry(
+        total=3, read=False, backoff_factor=0.3, respect_retry_after_header=False
+    ),
+    error_handler=http_errors,
+)
+
+
 def kandji_api(method, endpoint, params=None, payload=None):
     """Make an API request and return data.
 
@@ -260,68 +287,13 @@ def kandji_api(method, endpoint, params=None, payload=None):
                methods.
     Returns a JSON data object.
     """
-    retries = Retry(
-        total=3,
-        backoff_factor=0.3,
-        allowed_methods=["GET", "PUT", "POST", "DELETE"],
-        status_forcelist=[500, 502, 503, 504],
-    )
-    attom_adapter = HTTPAdapter(max_retries=retries)
-    session = requests.Session()
-    session.mount(BASE_URL, attom_adapter)
-
-    try:
-        response = session.request(
-            method,
-            BASE_URL + endpoint,
-            data=payload,
-            headers=HEADERS,
-            params=params,
-            timeout=30,
-        )
-
-        # If a successful status code is returned (200 and 300 range)
-        if response:
-            try:
-                data = response.json()
-            except Exception:
-                data = response.text
-
-        # if the request is successful exceptions will not be raised
-        response.raise_for_status()
-
-    except requests.exceptions.RequestException as err:
-        http_errors(resp=response, resp_code=response.status_code, err_msg=err)
-        data = {"error": f"{response.status_code}", "api resp": f"{err}"}
-
-    return data
+    return CLIENT.kandji_api(method, endpoint, params=params, payload=payload)
 
 
 def get_ade_devices():
     """Return ADE device records."""
-    # inventory
-    data = []
-
-    # set starting page number for pagination
-    page = 1
-
-    while True:
-        params = {"page": f"{page}"}
-
-        # check to see if a platform was specified
-        response = kandji_api(
-            method="GET",
-            endpoint="/v1/integrations/apple/ade/devices",
-            params=params,
-        )
-
-        # append results to the data list
-        data += response.get("results")
-
-        if response.get("next") is None:
-            break  # no more pages to return
-
-        page += 1
+    # inventory. Pages after the first are requested several at a time.
+    data = pagination.get_results(CLIENT, "/v1/integrations/apple/ade/devices")
 
     if len(data) < 1:
         print("No ADE devices found...\n")
@@ -407,7 +379,7 @@ def create_record_update_payload(_input, enrollment_status):
 
         # Here we are verifying that the value in the device record is not null or empty.
         # If the value is null, we will clear the user or asset tag on the device record.
-        # We want to check for empty values because the user, and asset_tag keys cannot 
+        # We want to check for empty values because the user, and asset_tag keys cannot
         # be empty strings in the in json payload sent to Kandji. If these keys are sent
         # as an empty string Kandji will return an error.
         if value != "" and key in ["asset_tag", "user"]: